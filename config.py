@@ -32,7 +32,10 @@ CLUSTERING = {
     "k_max": 10,
     "k_default": 4,
     "random_state": 42,
-    "n_init": 10
+    "n_init": 10,
+    "stability_runs": 20,
+    "stability_sample_frac": 0.8,
+    "stability_jobs": None
 }
 
 # ==================== ARIMA ====================
@@ -40,7 +43,79 @@ ARIMA = {
     "order": (1, 1, 1),
     "test_size": 3,
     "min_periods": 5,
-    "random_state": 42
+    "random_state": 42,
+    "group_col": "COLE_DEPTO_UBICACION",
+    "batch_jobs": None,
+    "alpha": 0.05,
+    "n_paths": 2000,
+    "orders_file": ".cache/ordenes_arima.json",
+    "order_search": {
+        "p_values": range(0, 4),
+        "d_values": range(0, 3),
+        "q_values": range(0, 4),
+        "criterion": "aic",
+        "time_budget": 60.0,
+        "prune_delta": 10.0
+    },
+    "backtest": {
+        "horizon": 3,
+        "min_train": 6,
+        "window": None,
+        "refit_every": None
+    }
+}
+
+FORECAST_SERVICE = {
+    "horizon": 3,
+    "alpha": 0.05,
+    "n_paths": 2000,
+    "shared_file": ".cache/pronosticos_servidos.json"     # compartido entre workers (None: por proceso)
+}
+
+FORECAST_CACHE = {
+    "path": ".cache/pronosticos.sqlite",
+    "max_entries": 2000
+}
+
+# ==================== API ====================
+API = {
+    "batch_chunk_size": 5000,
+    "upload_max_errors": 100,
+    "recommendation_cache_size": 10000,
+    "page_size": 100,
+    "max_page_size": 1000,
+    "executor_workers": 4,          # hilos para el trabajo de CPU y el almacenamiento
+    "fast_json": False              # orjson y respuestas sin revalidar (requiere orjson)
+}
+
+DEPLOY = {
+    "bind": "0.0.0.0:8000",
+    "workers": None,                # None: un worker por núcleo
+    "timeout": 120
+}
+
+STORAGE = {
+    "backend": "sqlite",            # "sqlite", "columnar", "particionado" o "memoria"
+    "path": ".cache/estudiantes.sqlite",
+    "pool_size": 8,
+    "initial_capacity": 1024,       # filas iniciales del backend columnar
+    "shards": 16,                   # franjas del backend particionado
+    "shard_backend": "columnar",    # cada franja: "columnar" o "memoria"
+    "journal_dir": None,            # p.ej. ".cache/diario": registro + instantáneas (columnar/particionado)
+    "journal_fsync": False,         # fsync por escritura (sobrevive a cortes de energía, más lento)
+    "snapshot_every": 1_000_000     # filas registradas entre instantáneas
+}
+
+PEERS = {
+    "k": 50,
+    "max_k": 500,
+    "leaf_size": 40,
+    "index_file": ".cache/indice_pares.pkl"
+}
+
+PERCENTILES = {
+    "group_col": "COLE_DEPTO_UBICACION",
+    "min_cohort": 30
 }
 
 # ==================== RECOMENDACIONES ====================
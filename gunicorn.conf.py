@@ -0,0 +1,43 @@
+# gunicorn.conf.py
+"""
+Despliegue multi-proceso de la API
+
+    gunicorn -c gunicorn.conf.py main:app
+
+- Un worker uvicorn por núcleo (API_WORKERS o DEPLOY["workers"] para fijarlo)
+- preload_app: el motor de recomendación, los pronósticos y los índices se
+  cargan una vez en el proceso maestro y los workers los heredan al crearse
+- El estado de los estudiantes vive en el almacenamiento compartido (SQLite) y
+  los pronósticos en FORECAST_SERVICE["shared_file"], que cada worker recarga
+  cuando otro los recalcula (POST /forecast/refresh)
+- kill -HUP reinicia los workers pero no vuelve a ejecutar when_ready: los
+  índices del maestro no se recalculan; tras cambiar el CSV, reiniciar
+"""
+
+import os
+import multiprocessing
+from config import DEPLOY, STORAGE
+
+bind = os.environ.get("API_BIND", DEPLOY["bind"])
+workers = int(os.environ.get("API_WORKERS", DEPLOY["workers"] or multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = DEPLOY["timeout"]
+graceful_timeout = 30
+keepalive = 5
+
+
+def on_starting(server):
+    """Los backends en memoria no se comparten entre procesos"""
+    if workers > 1 and STORAGE["backend"] != "sqlite":
+        raise RuntimeError(
+            f"El backend '{STORAGE['backend']}' es por proceso; con {workers} workers use 'sqlite'"
+        )
+
+
+def when_ready(server):
+    """Precalentar en el maestro (antes de crear los workers)"""
+    import main
+    main.warm_up(background=False)
+    # Las conexiones SQLite no deben cruzar el fork: cada worker abre las suyas
+    main.store.close()
@@ -1,22 +1,88 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel, Field
 from typing import Optional, Dict, List
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from email.utils import format_datetime, parsedate_to_datetime
+import numpy as np
+import pandas as pd
+import threading
+import asyncio
+import base64
+import json
 import sys
 import os
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'modulos'))
 from recommendation import RecommendationEngine
+from forecast_service import ForecastService
+from peers import PeerIndex
+from percentiles import PercentileIndex
+from response_cache import RecommendationCache
+from storage import create_store
+from config import (CSV_FILE, ARIMA as ARIMA_CONFIG, FORECAST_SERVICE, API as API_CONFIG,
+                    PEERS as PEERS_CONFIG, PERCENTILES as PERCENTILES_CONFIG, STORAGE as STORAGE_CONFIG)
 
 # ==================== CONFIGURACIÓN ====================
 
+# Ruta rápida de JSON (opcional, requiere orjson): serialización con orjson y
+# modelos de respuesta construidos sin revalidar datos que ya son válidos
+FAST_JSON = bool(API_CONFIG['fast_json']) and orjson is not None
+
+# ==================== SERIALIZACIÓN ====================
+
+def a_json(obj):
+    """JSON en bytes (orjson en la ruta rápida)"""
+    if FAST_JSON:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def construir(modelo, **campos):
+    """
+    Instancia de un modelo de respuesta
+    
+    En la ruta rápida no se valida: los campos salen del motor y del
+    almacenamiento, que ya validaron los datos de entrada.
+    """
+    if not FAST_JSON:
+        return modelo(**campos)
+    construct = getattr(modelo, "model_construct", None) or modelo.construct
+    return construct(**campos)
+
+
+def cuerpo_json(respuesta: BaseModel):
+    """Bytes de un modelo de respuesta, listos para Response o la caché"""
+    if FAST_JSON:
+        dump = getattr(respuesta, "model_dump", None) or respuesta.dict
+        return a_json(dump())
+    return JSONResponse(content=jsonable_encoder(respuesta)).body
+
+
+class RespuestaJSONRapida(JSONResponse):
+    """Respuesta por defecto de la ruta rápida (serializada con a_json)"""
+    
+    def render(self, content) -> bytes:
+        return a_json(content)
+
+
 app = FastAPI(
     title="API de Recomendación ICFES",
     description="Sistema de recomendación de áreas de estudio basado en puntuaciones ICFES",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=RespuestaJSONRapida if FAST_JSON else JSONResponse
 )
 
 app.add_middleware(
@@ -27,6 +93,45 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ==================== EJECUCIÓN ====================
+
+# El event loop solo atiende conexiones: el trabajo de CPU (motor, índices,
+# Pydantic, validación) y la E/S bloqueante del almacenamiento corren en un
+# pool acotado, así una petición pesada no detiene a las demás (ni /health).
+# Los hilos se crean con la primera tarea, después del fork de gunicorn.
+executor = ThreadPoolExecutor(
+    max_workers=API_CONFIG['executor_workers'],
+    thread_name_prefix="api-cpu"
+)
+
+
+async def en_executor(func, *args, **kwargs):
+    """Ejecutar func(*args, **kwargs) en el pool y esperar su resultado"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+
+async def iterar_en_executor(generador, por_paso=256):
+    """
+    Consumir un generador síncrono desde el pool, por bloques de elementos
+    
+    Para StreamingResponse: cada salto al pool produce hasta `por_paso`
+    partes de la respuesta.
+    """
+    while True:
+        partes = await en_executor(lambda: list(islice(generador, por_paso)))
+        if not partes:
+            return
+        for parte in partes:
+            yield parte
+
+
+@app.on_event("shutdown")
+async def shutdown_resources():
+    executor.shutdown(wait=True)
+    # Con diario, los backends en memoria escriben aquí su instantánea final
+    store.close()
+
 # ==================== MODELOS ====================
 
 class ScoresInput(BaseModel):
@@ -64,6 +169,7 @@ class TopArea(BaseModel):
     area: str
     puntuacion: float
     categoria: str
+    percentil: Optional[float] = None
 
 
 class Recomendacion(BaseModel):
@@ -85,6 +191,24 @@ class RecommendationResponse(BaseModel):
     mensaje: str
 
 
+class PerfilPares(BaseModel):
+    """Resumen del grupo de estudiantes similares"""
+    k: int
+    distancia_media: float
+    distancia_max: float
+    puntuaciones_medias: Dict[str, float]
+
+
+class PeerRecommendationResponse(BaseModel):
+    """Respuesta de recomendación por pares"""
+    estudiante_id: str
+    timestamp: str
+    puntuaciones: Dict[str, float]
+    pares: PerfilPares
+    recomendaciones: List[Recomendacion]
+    mensaje: str
+
+
 class HealthResponse(BaseModel):
     """Respuesta de salud"""
     status: str
@@ -94,8 +218,21 @@ class HealthResponse(BaseModel):
 
 # ==================== ALMACENAMIENTO ====================
 
-# Almacenar datos de estudiantes (en producción usar DB)
-estudiantes_data: Dict[str, Dict] = {}
+# Almacenar datos de estudiantes (backend configurable, SQLite por defecto)
+store = create_store(STORAGE_CONFIG)
+
+# Campos de entrada -> columnas de puntuación
+CAMPOS_PUNTAJE = {
+    'punt_ingles': 'PUNT_INGLES',
+    'punt_matematicas': 'PUNT_MATEMATICAS',
+    'punt_sociales_ciudadanas': 'PUNT_SOCIALES_CIUDADANAS',
+    'punt_c_naturales': 'PUNT_C_NATURALES',
+    'punt_lectura_critica': 'PUNT_LECTURA_CRITICA'
+}
+AREAS = list(CAMPOS_PUNTAJE.values())
+
+# Respuestas de recomendación ya calculadas (por estudiante y versión de puntuaciones)
+recommendation_cache = RecommendationCache(max_entries=API_CONFIG['recommendation_cache_size'])
 
 # Inicializar motor
 try:
@@ -105,6 +242,331 @@ except Exception as e:
     print(f"❌ Error inicializando motor: {e}")
     recommender = None
 
+# Pronósticos precalculados al refrescar los datos
+forecast_service = ForecastService(
+    CSV_FILE,
+    order=ARIMA_CONFIG['order'],
+    horizon=FORECAST_SERVICE['horizon'],
+    alpha=FORECAST_SERVICE['alpha'],
+    n_paths=FORECAST_SERVICE['n_paths'],
+    group_col=ARIMA_CONFIG['group_col'],
+    orders_file=ARIMA_CONFIG['orders_file'],
+    n_jobs=ARIMA_CONFIG['batch_jobs'],
+    random_state=ARIMA_CONFIG['random_state'],
+    shared_file=FORECAST_SERVICE['shared_file']
+)
+
+# Un solo recálculo a la vez (precalentamiento o POST /forecast/refresh)
+refresh_lock = threading.Lock()
+
+
+def refresh_forecasts():
+    """Recalcular pronósticos a partir del archivo de datos"""
+    try:
+        with refresh_lock:
+            total = forecast_service.refresh()
+        print(f"✅ Pronósticos precalculados: {total} series")
+    except Exception as e:
+        print(f"❌ Error precalculando pronósticos: {e}")
+
+
+# Índice de vecinos sobre los estudiantes históricos (recomendación por pares)
+peer_index: Optional[PeerIndex] = None
+
+
+def build_peer_index():
+    """Construir (o cargar desde disco) el índice de pares"""
+    global peer_index
+    try:
+        peer_index = PeerIndex.from_csv(
+            CSV_FILE, recommender,
+            index_file=PEERS_CONFIG['index_file'],
+            leaf_size=PEERS_CONFIG['leaf_size']
+        )
+        print(f"✅ Índice de pares listo: {peer_index.n_students} estudiantes")
+    except Exception as e:
+        print(f"❌ Error construyendo índice de pares: {e}")
+
+
+# Puntajes históricos ordenados por cohorte (nacional y por departamento)
+percentile_index = PercentileIndex(
+    AREAS,
+    group_col=PERCENTILES_CONFIG['group_col'],
+    min_cohort=PERCENTILES_CONFIG['min_cohort']
+)
+
+
+def build_percentile_index():
+    """Ordenar los puntajes históricos para consultas de percentil"""
+    try:
+        header = pd.read_csv(CSV_FILE, nrows=0).columns
+        columnas = AREAS + [c for c in [PERCENTILES_CONFIG['group_col']] if c in header]
+        total = percentile_index.build(pd.read_csv(CSV_FILE, usecols=columnas, low_memory=False))
+        # Las respuestas en caché se calcularon sin percentiles
+        recommendation_cache.clear()
+        print(f"✅ Percentiles listos: {total} cohortes")
+    except Exception as e:
+        print(f"❌ Error construyendo percentiles: {e}")
+
+
+def percentiles_top_areas(top_areas, scores_dict, departamento=None):
+    """Agregar el percentil de cada área top (None si aún no hay índice)"""
+    if not percentile_index.ready:
+        return top_areas
+    percentiles = percentile_index.student_percentiles(scores_dict, departamento)
+    return [{**top, "percentil": percentiles[f"PUNT_{top['area']}"]} for top in top_areas]
+
+
+# Precalentamiento de datos de solo lectura (pronósticos e índices)
+warmup_state = {"iniciado": False}
+
+
+def warm_up(background=True):
+    """
+    Construir pronósticos e índices a partir del dataset (una sola vez)
+    
+    background=False los construye en el hilo actual; gunicorn lo usa en el
+    proceso maestro antes de crear los workers (gunicorn.conf.py), que
+    heredan los datos ya cargados.
+    """
+    if warmup_state["iniciado"] or not os.path.exists(CSV_FILE):
+        return
+    warmup_state["iniciado"] = True
+    
+    # Pronósticos ya publicados para este dataset y parámetros: no se recalculan
+    tareas = [build_percentile_index]
+    if forecast_service.sync():
+        print("✅ Pronósticos cargados desde el archivo compartido")
+    else:
+        tareas.insert(0, refresh_forecasts)
+    if recommender is not None:
+        tareas.append(build_peer_index)
+    
+    for tarea in tareas:
+        if background:
+            threading.Thread(target=tarea, daemon=True).start()
+        else:
+            tarea()
+
+
+def estado_componentes():
+    """Estado de cada componente para /ready (True si está listo para servir)"""
+    dataset = os.path.exists(CSV_FILE)
+    forecast_service.sync()
+    try:
+        len(store)
+        almacenamiento = True
+    except Exception:
+        almacenamiento = False
+    return {
+        "motor": recommender is not None,
+        "almacenamiento": almacenamiento,
+        "pronosticos": forecast_service.ready or not dataset,
+        "percentiles": percentile_index.ready or not dataset,
+        "pares": (peer_index is not None and peer_index.ready) or not dataset
+    }
+
+
+@app.on_event("startup")
+async def startup_forecasts():
+    """Precalcular pronósticos e índices en segundo plano si existe el dataset"""
+    warm_up()
+
+# ==================== CARGA MASIVA ====================
+
+async def leer_registros(request: Request):
+    """
+    Leer un lote de registros desde un arreglo JSON o un flujo NDJSON
+    
+    NDJSON (application/x-ndjson o application/jsonl) se procesa a medida
+    que llega el cuerpo: las líneas completas de cada bloque recibido se
+    decodifican en el pool y solo se retiene la línea incompleta.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    
+    if content_type in ("application/x-ndjson", "application/jsonl", "application/ndjson"):
+        registros = []
+        pendiente = b""
+        async for chunk in request.stream():
+            pendiente += chunk
+            corte = pendiente.rfind(b"\n")
+            if corte < 0:
+                continue
+            lineas, pendiente = pendiente[:corte], pendiente[corte + 1:]
+            registros.extend(await en_executor(decodificar_ndjson, lineas))
+        if pendiente.strip():
+            registros.extend(await en_executor(decodificar_ndjson, pendiente))
+        return registros
+    
+    return await en_executor(decodificar_json, await request.body())
+
+
+def decodificar_ndjson(bloque):
+    """Registros de un bloque de líneas NDJSON completas"""
+    try:
+        return [json.loads(linea) for linea in bloque.split(b"\n") if linea.strip()]
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"NDJSON inválido: {str(e)}")
+
+
+def decodificar_json(cuerpo):
+    """Registros de un cuerpo con un arreglo JSON"""
+    try:
+        registros = json.loads(cuerpo)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"JSON inválido: {str(e)}")
+    if not isinstance(registros, list):
+        raise HTTPException(status_code=400, detail="Se esperaba un arreglo JSON o un flujo NDJSON")
+    return registros
+
+
+def validar_lote(registros):
+    """
+    Validación vectorizada de un lote de puntuaciones
+    
+    Returns:
+        (ids, matriz de puntuaciones, máscara de válidos, errores por fila)
+    """
+    df = pd.DataFrame.from_records(
+        [r if isinstance(r, dict) else {} for r in registros],
+        columns=['estudiante_id'] + list(CAMPOS_PUNTAJE)
+    )
+    return validar_frame(df)
+
+
+def validar_frame(df, max_errores=None):
+    """
+    Validar un DataFrame con columnas estudiante_id + CAMPOS_PUNTAJE
+    
+    max_errores limita cuántos mensajes de error se construyen (la máscara
+    de válidos siempre cubre todas las filas).
+    """
+    ids = df['estudiante_id'].astype(object).where(df['estudiante_id'].notna(), None).to_numpy()
+    scores = df[list(CAMPOS_PUNTAJE)].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+    
+    id_ok = np.array([isinstance(i, str) and i != "" for i in ids], dtype=bool)
+    faltantes = np.isnan(scores)
+    fuera_rango = ~faltantes & ((scores < 0) | (scores > 100))
+    validos = id_ok & ~faltantes.any(axis=1) & ~fuera_rango.any(axis=1)
+    
+    campos = np.array(list(CAMPOS_PUNTAJE))
+    errores = {}
+    for fila in np.flatnonzero(~validos)[:max_errores]:
+        if not id_ok[fila]:
+            errores[fila] = "estudiante_id requerido"
+        elif faltantes[fila].any():
+            errores[fila] = f"Campos faltantes o no numéricos: {', '.join(campos[faltantes[fila]])}"
+        else:
+            errores[fila] = f"Fuera de rango (0-100): {', '.join(campos[fuera_rango[fila]])}"
+    
+    return ids, scores, validos, errores
+
+
+def leer_archivo_por_bloques(archivo: UploadFile, tamano):
+    """
+    Leer un CSV o Parquet subido en bloques de `tamano` filas
+    
+    Las columnas se aceptan con el nombre de POST /predict (punt_ingles) o
+    del dataset (PUNT_INGLES). Cada bloque es un DataFrame con
+    estudiante_id + CAMPOS_PUNTAJE.
+    """
+    nombre = (archivo.filename or "").lower()
+    es_parquet = nombre.endswith((".parquet", ".pq")) or "parquet" in (archivo.content_type or "")
+    columnas = ['estudiante_id'] + list(CAMPOS_PUNTAJE)
+    
+    def normalizar(bloque):
+        bloque = bloque.rename(columns=lambda c: str(c).strip().lower())
+        faltantes = [c for c in columnas if c not in bloque.columns]
+        if faltantes:
+            raise HTTPException(status_code=400, detail=f"Columnas faltantes: {', '.join(faltantes)}")
+        bloque = bloque[columnas]
+        ids = bloque['estudiante_id']
+        return bloque.assign(estudiante_id=ids.astype(str).str.strip().where(ids.notna(), None))
+    
+    if es_parquet:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise HTTPException(status_code=415, detail="Soporte Parquet no disponible (instalar pyarrow)")
+        try:
+            lector = pq.ParquetFile(archivo.file)
+            for lote in lector.iter_batches(batch_size=tamano):
+                yield normalizar(lote.to_pandas())
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Parquet inválido: {str(e)}")
+        return
+    
+    try:
+        for bloque in pd.read_csv(archivo.file, chunksize=tamano, dtype=str,
+                                  encoding_errors="replace", skipinitialspace=True):
+            yield normalizar(bloque)
+    except HTTPException:
+        raise
+    except (pd.errors.ParserError, UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"CSV inválido: {str(e)}")
+
+
+def guardar_lote(ids, scores):
+    """Guardar un lote de puntuaciones validadas con un mismo timestamp"""
+    timestamp = datetime.now().isoformat()
+    store.upsert_many(ids, scores, timestamp)
+    recommendation_cache.invalidate_many(ids)
+    return timestamp
+
+
+def guardar_estudiante(scores: ScoresInput):
+    """Guardar las puntuaciones de un estudiante"""
+    store.upsert(
+        scores.estudiante_id,
+        [getattr(scores, campo) for campo in CAMPOS_PUNTAJE],
+        datetime.now().isoformat()
+    )
+    recommendation_cache.invalidate(scores.estudiante_id)
+
+
+def recomendaciones_ndjson(ids, scores):
+    """Generar recomendaciones de un lote con el motor vectorizado, como líneas NDJSON"""
+    frame = recommender.get_recommendations_frame(scores)
+    
+    # Percentiles nacionales de las dos áreas top (búsqueda binaria vectorizada)
+    percentiles = np.full((len(frame), 2), np.nan)
+    if percentile_index.ready:
+        indices = {area.replace('PUNT_', ''): i for i, area in enumerate(AREAS)}
+        todos = percentile_index.percentiles(scores)
+        filas = np.arange(len(frame))
+        for k, col in enumerate(('area_1', 'area_2')):
+            cols = frame[col].map(indices).to_numpy()
+            percentiles[:, k] = np.round(todos[filas, cols], 2)
+    percentiles = np.where(np.isnan(percentiles), None, percentiles).tolist()
+    
+    for est_id, fila, rec, pct in zip(ids, scores.tolist(), frame.itertuples(index=False), percentiles):
+        yield _linea({
+            "estudiante_id": est_id,
+            "puntuaciones": dict(zip(AREAS, fila)),
+            "top_areas": [
+                {"area": rec.area_1, "puntuacion": rec.puntuacion_1, "categoria": rec.categoria_1,
+                 "percentil": pct[0]},
+                {"area": rec.area_2, "puntuacion": rec.puntuacion_2, "categoria": rec.categoria_2,
+                 "percentil": pct[1]}
+            ],
+            "recomendaciones": [
+                {"posicion": posicion, "carrera": carrera, "categoria": categoria,
+                 "razon": razon, "relevancia": relevancia}
+                for posicion, carrera, categoria, razon, relevancia in (
+                    (1, rec.carrera_1, rec.categoria_carrera_1, rec.razon_1, rec.relevancia_1),
+                    (2, rec.carrera_2, rec.categoria_carrera_2, rec.razon_2, rec.relevancia_2)
+                )
+                if carrera is not None
+            ]
+        })
+
+
+def _linea(obj):
+    return a_json(obj) + b"\n"
+
+
 # ==================== ENDPOINTS ====================
 
 @app.get("/health", response_model=HealthResponse, tags=["Sistema"])
@@ -117,6 +579,28 @@ async def health_check():
     )
 
 
+@app.get("/ready", tags=["Sistema"])
+async def readiness_check():
+    """
+    Verificar si el worker terminó de precalentar
+    
+    Responde 503 mientras falte algún componente (pronósticos, percentiles o
+    índice de pares en construcción, almacenamiento inaccesible). Pensado
+    para el balanceador o el orquestador; /health solo indica que el proceso
+    responde.
+    """
+    componentes = estado_componentes()
+    listo = all(componentes.values())
+    return JSONResponse(
+        status_code=200 if listo else 503,
+        content={
+            "listo": listo,
+            "pid": os.getpid(),
+            "componentes": componentes
+        }
+    )
+
+
 @app.post("/predict", response_model=UploadResponse, tags=["Carga de Datos"])
 async def upload_scores(scores: ScoresInput):
     """
@@ -144,14 +628,7 @@ async def upload_scores(scores: ScoresInput):
     """
     try:
         # Guardar datos
-        estudiantes_data[scores.estudiante_id] = {
-            'PUNT_INGLES': scores.punt_ingles,
-            'PUNT_MATEMATICAS': scores.punt_matematicas,
-            'PUNT_SOCIALES_CIUDADANAS': scores.punt_sociales_ciudadanas,
-            'PUNT_C_NATURALES': scores.punt_c_naturales,
-            'PUNT_LECTURA_CRITICA': scores.punt_lectura_critica,
-            'timestamp_guardado': datetime.now().isoformat()
-        }
+        await en_executor(guardar_estudiante, scores)
         
         return UploadResponse(
             mensaje=f"Datos del estudiante {scores.estudiante_id} guardados exitosamente",
@@ -164,15 +641,156 @@ async def upload_scores(scores: ScoresInput):
         raise HTTPException(status_code=500, detail=f"Error guardando datos: {str(e)}")
 
 
+@app.post("/predict/batch", tags=["Carga de Datos"])
+async def upload_scores_batch(request: Request):
+    """
+    Cargar puntuaciones de muchos estudiantes en una sola petición
+    
+    Acepta un arreglo JSON de objetos con el formato de POST /predict o un
+    flujo NDJSON (Content-Type: application/x-ndjson). La validación se hace
+    en bloque y la respuesta se devuelve como NDJSON: una línea por registro
+    y una línea final con el resumen.
+    
+    Ejemplo (NDJSON):
+        {"estudiante_id": "EST001", "punt_ingles": 75, "punt_matematicas": 88, ...}
+        {"estudiante_id": "EST002", "punt_ingles": 60, "punt_matematicas": 92, ...}
+    """
+    registros = await leer_registros(request)
+    tamano = API_CONFIG['batch_chunk_size']
+    
+    def generar():
+        guardados = 0
+        for inicio in range(0, len(registros), tamano):
+            ids, scores, validos, errores = validar_lote(registros[inicio:inicio + tamano])
+            timestamp = guardar_lote(ids[validos], scores[validos]) if validos.any() else None
+            guardados += int(validos.sum())
+            
+            for fila in range(len(ids)):
+                if validos[fila]:
+                    yield _linea({"fila": inicio + fila, "estudiante_id": ids[fila],
+                                  "estado": "guardado", "timestamp": timestamp})
+                else:
+                    yield _linea({"fila": inicio + fila, "estudiante_id": ids[fila],
+                                  "estado": "rechazado", "error": errores[fila]})
+        
+        yield _linea({"resumen": {
+            "recibidos": len(registros),
+            "guardados": guardados,
+            "rechazados": len(registros) - guardados
+        }})
+    
+    return StreamingResponse(iterar_en_executor(generar()), media_type="application/x-ndjson")
+
+
+@app.post("/students/upload", tags=["Carga de Datos"])
+async def upload_students_file(archivo: UploadFile = File(..., description="CSV o Parquet con estudiante_id y las 5 puntuaciones")):
+    """
+    Cargar un archivo CSV o Parquet con puntuaciones de muchos estudiantes
+    
+    El archivo se procesa por bloques (API_CONFIG['batch_chunk_size'] filas):
+    cada bloque se valida de forma vectorizada y las filas válidas se
+    guardan en bloque. Devuelve un resumen con las filas aceptadas y
+    rechazadas (con una muestra de los errores).
+    
+    Ejemplo:
+        curl -F "archivo=@colegio.csv" http://localhost:8000/students/upload
+    """
+    return await en_executor(procesar_archivo, archivo)
+
+
+def procesar_archivo(archivo: UploadFile):
+    """Validar y guardar un archivo subido, bloque por bloque"""
+    inicio = datetime.now()
+    tamano = API_CONFIG['batch_chunk_size']
+    max_errores = API_CONFIG['upload_max_errors']
+    
+    recibidos = guardados = 0
+    errores = []
+    timestamp = None
+    
+    for bloque in leer_archivo_por_bloques(archivo, tamano):
+        ids, scores, validos, errores_bloque = validar_frame(
+            bloque, max_errores=max(max_errores - len(errores), 0)
+        )
+        if validos.any():
+            timestamp = guardar_lote(ids[validos], scores[validos])
+        
+        errores.extend(
+            {"fila": recibidos + int(fila), "estudiante_id": ids[fila], "error": error}
+            for fila, error in errores_bloque.items()
+        )
+        recibidos += len(ids)
+        guardados += int(validos.sum())
+    
+    return {
+        "archivo": archivo.filename,
+        "recibidos": recibidos,
+        "guardados": guardados,
+        "rechazados": recibidos - guardados,
+        "timestamp": timestamp,
+        "duracion_s": round((datetime.now() - inicio).total_seconds(), 3),
+        "errores": errores
+    }
+
+
+@app.post("/recommendation/batch", tags=["Recomendaciones"])
+async def get_recommendation_batch(request: Request):
+    """
+    Obtener recomendaciones para muchos estudiantes guardados
+    
+    Acepta un arreglo JSON o un flujo NDJSON de IDs (texto) u objetos con
+    "estudiante_id". Las recomendaciones se generan por bloques con el motor
+    vectorizado y se devuelven como NDJSON (una línea por estudiante).
+    """
+    if recommender is None:
+        raise HTTPException(status_code=500, detail="Motor de recomendación no inicializado")
+    
+    registros = await leer_registros(request)
+    ids_solicitados = [r.get("estudiante_id") if isinstance(r, dict) else r for r in registros]
+    tamano = API_CONFIG['batch_chunk_size']
+    
+    def generar():
+        encontrados = 0
+        for inicio in range(0, len(ids_solicitados), tamano):
+            bloque = ids_solicitados[inicio:inicio + tamano]
+            salida = [None] * len(bloque)
+            hallados, filas = store.get_scores(bloque)
+            posiciones = np.flatnonzero(hallados).tolist()
+            ids = [bloque[pos] for pos in posiciones]
+            for pos in np.flatnonzero(~hallados):
+                salida[pos] = _linea({"estudiante_id": bloque[pos], "error": "Estudiante no encontrado"})
+            
+            if ids:
+                encontrados += len(ids)
+                lineas = recomendaciones_ndjson(ids, filas)
+                for pos, linea in zip(posiciones, lineas):
+                    salida[pos] = linea
+            
+            yield from salida
+        
+        yield _linea({"resumen": {
+            "solicitados": len(ids_solicitados),
+            "recomendados": encontrados,
+            "no_encontrados": len(ids_solicitados) - encontrados
+        }})
+    
+    return StreamingResponse(iterar_en_executor(generar()), media_type="application/x-ndjson")
+
+
 @app.get("/recommendation/{estudiante_id}", response_model=RecommendationResponse, tags=["Recomendaciones"])
-async def get_recommendation(estudiante_id: str):
+async def get_recommendation(estudiante_id: str, departamento: Optional[str] = None):
     """
     Obtener recomendaciones para un estudiante
     
     Recupera los datos guardados del estudiante y genera recomendaciones.
+    Cada área top incluye su percentil frente a la cohorte nacional (o la del
+    departamento indicado). Las respuestas se guardan en caché hasta que el
+    estudiante se actualiza o elimina (encabezado X-Cache: HIT/MISS); el
+    timestamp corresponde al momento en que se generó la recomendación.
     
     Args:
         estudiante_id: ID del estudiante (path parameter)
+        departamento: cohorte para el percentil (query parameter, opcional)
     
     Returns:
         Recomendaciones basadas en puntuaciones guardadas
@@ -183,59 +801,223 @@ async def get_recommendation(estudiante_id: str):
     if recommender is None:
         raise HTTPException(status_code=500, detail="Motor de recomendación no inicializado")
     
+    return await en_executor(generar_recomendacion, estudiante_id, departamento)
+
+
+def generar_recomendacion(estudiante_id, departamento=None):
+    """Respuesta de GET /recommendation/{id} (desde la caché o calculada)"""
     # Verificar que el estudiante exista
-    if estudiante_id not in estudiantes_data:
+    registro = store.get(estudiante_id)
+    if registro is None:
         raise HTTPException(
             status_code=404,
             detail=f"No se encontraron datos para el estudiante {estudiante_id}"
         )
     
+    variante = (departamento.strip().upper() if departamento else None, percentile_index.ready)
+    cuerpo = recommendation_cache.get(estudiante_id, registro['timestamp_guardado'], variante)
+    if cuerpo is not None:
+        return Response(content=cuerpo, media_type="application/json", headers={"X-Cache": "HIT"})
+    
     try:
         # Obtener datos guardados
-        scores_dict = estudiantes_data[estudiante_id].copy()
+        scores_dict = registro.copy()
         timestamp_guardado = scores_dict.pop('timestamp_guardado')
         
         # Generar recomendaciones
         rec = recommender.get_recommendations(scores_dict)
+        top_areas = percentiles_top_areas(rec['top_areas'], scores_dict, departamento)
         
         # Construir respuesta
-        response = RecommendationResponse(
+        response = construir(
+            RecommendationResponse,
             estudiante_id=estudiante_id,
             timestamp=datetime.now().isoformat(),
             puntuaciones=scores_dict,
-            top_areas=[TopArea(**top) for top in rec['top_areas']],
-            recomendaciones=[Recomendacion(**rec_item) for rec_item in rec['recomendaciones']],
+            top_areas=[construir(TopArea, **top) for top in top_areas],
+            recomendaciones=[construir(Recomendacion, **rec_item) for rec_item in rec['recomendaciones']],
             mensaje="Recomendación generada exitosamente"
         )
         
-        return response
+        cuerpo = cuerpo_json(response)
+        recommendation_cache.put(estudiante_id, timestamp_guardado, cuerpo, variante)
+        return Response(content=cuerpo, media_type="application/json", headers={"X-Cache": "MISS"})
     
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generando recomendación: {str(e)}")
 
 
-@app.get("/students", tags=["Consultas"])
-async def list_students():
+@app.get("/percentile/{estudiante_id}", tags=["Recomendaciones"])
+async def get_percentile(estudiante_id: str, departamento: Optional[str] = None):
     """
-    Listar todos los estudiantes cargados
+    Percentiles del estudiante por área frente a la población histórica
     
-    Returns:
-        Lista de IDs de estudiantes y sus timestamps
+    Siempre incluye la cohorte nacional; con departamento agrega también la
+    de ese departamento. Cada consulta es una búsqueda binaria sobre
+    puntajes preordenados.
+    
+    Ejemplo:
+        GET /percentile/EST001?departamento=ANTIOQUIA
     """
+    if not percentile_index.ready:
+        raise HTTPException(status_code=503, detail="Percentiles no disponibles todavía")
+    
+    return await en_executor(calcular_percentiles, estudiante_id, departamento)
+
+
+def calcular_percentiles(estudiante_id, departamento=None):
+    """Respuesta de GET /percentile/{id}"""
+    scores_dict = store.get(estudiante_id)
+    if scores_dict is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No se encontraron datos para el estudiante {estudiante_id}"
+        )
+    scores_dict.pop('timestamp_guardado')
+    
+    cohortes = {"nacional": None}
+    if departamento:
+        if percentile_index.cohort_size(departamento) is None:
+            raise HTTPException(status_code=404, detail=f"Sin cohorte para el departamento {departamento}")
+        cohortes["departamento"] = departamento
+    
+    resultado = {nombre: percentile_index.student_percentiles(scores_dict, depto)
+                 for nombre, depto in cohortes.items()}
+    
     return {
-        "total_estudiantes": len(estudiantes_data),
-        "estudiantes": [
-            {
-                "id": est_id,
-                "timestamp_guardado": data.get('timestamp_guardado')
+        "estudiante_id": estudiante_id,
+        "departamento": departamento.strip().upper() if departamento else None,
+        "tamano_cohorte": {nombre: percentile_index.cohort_size(depto) for nombre, depto in cohortes.items()},
+        "areas": {
+            area.replace('PUNT_', ''): {
+                "puntuacion": scores_dict[area],
+                **{f"percentil_{nombre}": resultado[nombre][area] for nombre in cohortes}
             }
-            for est_id, data in estudiantes_data.items()
-        ]
+            for area in AREAS
+        }
     }
 
 
+@app.get("/recommendation/{estudiante_id}/peers", response_model=PeerRecommendationResponse, tags=["Recomendaciones"])
+async def get_peer_recommendation(estudiante_id: str, k: int = PEERS_CONFIG['k']):
+    """
+    Obtener recomendaciones a partir de estudiantes históricos similares
+    
+    Busca en el índice KD-tree los k estudiantes del dataset con puntajes
+    más parecidos y recomienda las carreras más sugeridas a ese grupo.
+    
+    Args:
+        estudiante_id: ID del estudiante (path parameter)
+        k: tamaño del grupo de pares (query parameter)
+    
+    Ejemplo:
+        GET /recommendation/EST001/peers?k=100
+    """
+    if peer_index is None or not peer_index.ready:
+        raise HTTPException(status_code=503, detail="Índice de pares no disponible todavía")
+    
+    if not 1 <= k <= PEERS_CONFIG['max_k']:
+        raise HTTPException(status_code=400, detail=f"k debe estar entre 1 y {PEERS_CONFIG['max_k']}")
+    
+    return await en_executor(recomendar_por_pares, estudiante_id, k)
+
+
+def recomendar_por_pares(estudiante_id, k):
+    """Respuesta de GET /recommendation/{id}/peers"""
+    scores_dict = store.get(estudiante_id)
+    if scores_dict is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No se encontraron datos para el estudiante {estudiante_id}"
+        )
+    scores_dict.pop('timestamp_guardado')
+    
+    try:
+        rec = peer_index.recommend(scores_dict, k=k)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    respuesta = construir(
+        PeerRecommendationResponse,
+        estudiante_id=estudiante_id,
+        timestamp=datetime.now().isoformat(),
+        puntuaciones=scores_dict,
+        pares=construir(PerfilPares, **rec['pares']),
+        recomendaciones=[construir(Recomendacion, **rec_item) for rec_item in rec['recomendaciones']],
+        mensaje="Recomendación por pares generada exitosamente"
+    )
+    return Response(content=cuerpo_json(respuesta), media_type="application/json")
+
+
+def codificar_cursor(timestamp, est_id):
+    """Cursor opaco con la llave (timestamp, id) del último elemento"""
+    return base64.urlsafe_b64encode(json.dumps([timestamp, est_id]).encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    try:
+        timestamp, est_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(timestamp), str(est_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+@app.get("/students", tags=["Consultas"])
+async def list_students(
+    cursor: Optional[str] = None,
+    limit: int = API_CONFIG['page_size'],
+    orden: str = "timestamp",
+    descendente: bool = False,
+    incluir_puntuaciones: bool = False
+):
+    """
+    Listar estudiantes cargados, paginado por cursor
+    
+    Args:
+        cursor: valor de "siguiente_cursor" de la página anterior
+        limit: estudiantes por página (máximo API_CONFIG['max_page_size'])
+        orden: "timestamp" (fecha de guardado) o "id"
+        descendente: invertir el orden
+        incluir_puntuaciones: agregar las puntuaciones de cada estudiante
+    
+    Returns:
+        Página de IDs con sus timestamps (y puntuaciones) y el cursor de la
+        siguiente página (null al terminar). La respuesta se envía por partes.
+    
+    Ejemplo:
+        GET /students?limit=500&incluir_puntuaciones=true
+        GET /students?limit=500&cursor=WyIyMDI2LTAx...
+    """
+    if orden not in ("timestamp", "id"):
+        raise HTTPException(status_code=400, detail="orden debe ser 'timestamp' o 'id'")
+    if not 1 <= limit <= API_CONFIG['max_page_size']:
+        raise HTTPException(status_code=400, detail=f"limit debe estar entre 1 y {API_CONFIG['max_page_size']}")
+    
+    despues = decodificar_cursor(cursor) if cursor else None
+    
+    def generar():
+        pagina = store.iter_page(after=despues, limit=limit, order_by=orden,
+                                 descending=descendente, include_scores=incluir_puntuaciones)
+        yield f'{{"total_estudiantes": {len(store)}, "estudiantes": ['
+        ultimo = None
+        cantidad = 0
+        for est_id, timestamp, puntuaciones in pagina:
+            item = {"id": est_id, "timestamp_guardado": timestamp}
+            if incluir_puntuaciones:
+                item["puntuaciones"] = dict(zip(AREAS, puntuaciones))
+            yield (b"," if cantidad else b"") + a_json(item)
+            ultimo = (timestamp, est_id)
+            cantidad += 1
+        siguiente = codificar_cursor(*ultimo) if cantidad == limit else None
+        yield f'], "cantidad": {cantidad}, "siguiente_cursor": {json.dumps(siguiente)}}}'
+    
+    return StreamingResponse(iterar_en_executor(generar()), media_type="application/json")
+
+
 @app.get("/student/{estudiante_id}", tags=["Consultas"])
 async def get_student_data(estudiante_id: str):
     """
@@ -247,13 +1029,13 @@ async def get_student_data(estudiante_id: str):
     Returns:
         Puntuaciones guardadas del estudiante
     """
-    if estudiante_id not in estudiantes_data:
+    data = await en_executor(store.get, estudiante_id)
+    if data is None:
         raise HTTPException(
             status_code=404,
             detail=f"No se encontraron datos para {estudiante_id}"
         )
     
-    data = estudiantes_data[estudiante_id].copy()
     return {
         "estudiante_id": estudiante_id,
         "puntuaciones": {k: v for k, v in data.items() if k != 'timestamp_guardado'},
@@ -269,31 +1051,147 @@ async def delete_student(estudiante_id: str):
     Args:
         estudiante_id: ID del estudiante a eliminar
     """
-    if estudiante_id not in estudiantes_data:
+    if not await en_executor(eliminar_estudiante, estudiante_id):
         raise HTTPException(
             status_code=404,
             detail=f"Estudiante {estudiante_id} no encontrado"
         )
     
-    del estudiantes_data[estudiante_id]
-    
     return {
         "mensaje": f"Datos del estudiante {estudiante_id} eliminados",
         "timestamp": datetime.now().isoformat()
     }
 
 
+def eliminar_estudiante(estudiante_id):
+    """Eliminar un estudiante y sus respuestas en caché"""
+    if not store.delete(estudiante_id):
+        return False
+    recommendation_cache.invalidate(estudiante_id)
+    return True
+
+
+@app.get("/forecast/{area}", tags=["Pronósticos"])
+async def get_forecast(area: str, request: Request, response: Response, departamento: Optional[str] = None):
+    """
+    Obtener el pronóstico precalculado de un área
+    
+    Soporta peticiones condicionales (If-None-Match / If-Modified-Since):
+    si el pronóstico pedido no cambió desde la última consulta responde 304.
+    El ETag es el de ese pronóstico: un recálculo que no lo cambia no lo invalida.
+    
+    Args:
+        area: área ICFES (p.ej. MATEMATICAS o PUNT_MATEMATICAS)
+        departamento: departamento opcional (query parameter)
+    
+    Returns:
+        Histórico, pronóstico por paso e intervalos de confianza
+    
+    Ejemplo:
+        GET /forecast/MATEMATICAS?departamento=TOLIMA
+    """
+    # Recoger un recálculo hecho en otro worker
+    forecast_service.sync()
+    if not forecast_service.ready:
+        raise HTTPException(status_code=503, detail="Pronósticos aún no disponibles")
+    
+    entrada = forecast_service.get_versioned(area, departamento)
+    if entrada is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No hay pronóstico para {area}" + (f" en {departamento}" if departamento else "")
+        )
+    payload, etag, last_modified = entrada
+    
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified, usegmt=True),
+        "Cache-Control": "no-cache"
+    }
+    
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+    elif if_modified_since is not None:
+        try:
+            if last_modified.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since):
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+    
+    response.headers.update(headers)
+    return payload
+
+
+@app.get("/forecast", tags=["Pronósticos"])
+async def list_forecasts():
+    """
+    Listar las series con pronóstico precalculado
+    
+    Returns:
+        Pares (departamento, área) disponibles y versión de los pronósticos
+    """
+    forecast_service.sync()
+    return {
+        "disponible": forecast_service.ready,
+        "etag": forecast_service.etag,
+        "series": [
+            {"departamento": group or None, "area": area}
+            for group, area in forecast_service.available()
+        ]
+    }
+
+
+@app.post("/forecast/refresh", tags=["Pronósticos"])
+async def refresh_forecast_data():
+    """
+    Recalcular los pronósticos tras actualizar el archivo de datos
+    
+    Responde 409 si ya hay un recálculo en curso en este worker. Los
+    pronósticos nuevos se publican en FORECAST_SERVICE["shared_file"] y los
+    demás workers los cargan en su siguiente consulta.
+    """
+    if not os.path.exists(CSV_FILE):
+        raise HTTPException(status_code=404, detail=f"Archivo '{CSV_FILE}' no encontrado")
+    
+    if not refresh_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="Ya hay un recálculo de pronósticos en curso")
+    try:
+        total = await en_executor(forecast_service.refresh)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error recalculando pronósticos: {str(e)}")
+    finally:
+        refresh_lock.release()
+    
+    return {
+        "mensaje": "Pronósticos recalculados",
+        "series": total,
+        "etag": forecast_service.etag,
+        "timestamp": datetime.now().isoformat()
+    }
+
+
 @app.get("/stats", tags=["Estadísticas"])
 async def get_statistics():
     """
     Obtener estadísticas del sistema
     
+    Las estadísticas salen de agregados que el almacenamiento mantiene en
+    cada escritura, así que consultarlas no recorre los datos.
+    
     Returns:
-        Total de estudiantes cargados
+        Total de estudiantes, media, desviación e histograma por área,
+        conteo de la categoría de la primera recomendación y estado de la
+        caché de recomendaciones
     """
+    resumen = await en_executor(store.stats)
     return {
         "timestamp": datetime.now().isoformat(),
-        "total_estudiantes": len(estudiantes_data)
+        "total_estudiantes": resumen.pop("total"),
+        **resumen,
+        "cache_recomendaciones": recommendation_cache.stats()
     }
 
 
@@ -306,13 +1204,18 @@ async def root():
         "descripcion": "Sistema de recomendación de áreas de estudio",
         "flujo": {
             "paso_1": "POST /upload → Guardar puntuaciones del estudiante",
-            "paso_2": "GET /recommendation/{id} → Obtener recomendaciones"
+            "paso_2": "GET /recommendation/{id} → Obtener recomendaciones",
+            "pares": "GET /recommendation/{id}/peers → Recomendación según estudiantes similares",
+            "percentiles": "GET /percentile/{id}?departamento= → Percentiles por área",
+            "pronosticos": "GET /forecast/{area}?departamento= → Pronóstico con intervalos"
         },
         "documentacion": "/docs"
     }
 
 
 if __name__ == "__main__":
+    # Desarrollo: un proceso con recarga automática.
+    # Producción multi-proceso: gunicorn -c gunicorn.conf.py main:app
     import uvicorn
     uvicorn.run(
         "main:app",
@@ -0,0 +1,150 @@
+# aggregates.py
+"""
+Módulo de Agregados Incrementales
+- Conteo, suma y suma de cuadrados por área
+- Histogramas de ancho fijo (0-100) por área
+- Conteo de la categoría de la primera recomendación (categoría del área top)
+- Se actualizan con cada alta, cambio o baja; consultarlos cuesta O(1)
+"""
+
+import numpy as np
+
+
+class RunningAggregates:
+    """Estadísticas de la cohorte mantenidas en cada escritura"""
+
+    def __init__(self, areas, area_categories, n_bins=10, low=0.0, high=100.0):
+        self.areas = list(areas)
+        self.categories = sorted(set(area_categories[area] for area in self.areas))
+        self._area_category = np.array(
+            [self.categories.index(area_categories[area]) for area in self.areas], dtype=np.int64
+        )
+        self.n_bins = n_bins
+        self.low = low
+        self.high = high
+        self.reset()
+
+    def reset(self):
+        n_areas = len(self.areas)
+        self.count = 0
+        self.sum = np.zeros(n_areas)
+        self.sum_sq = np.zeros(n_areas)
+        self.histogram = np.zeros((n_areas, self.n_bins), dtype=np.int64)
+        self.category_counts = np.zeros(len(self.categories), dtype=np.int64)
+
+    # ==================== DELTAS ====================
+
+    def delta(self, scores, weights=None):
+        """
+        Contribución de un bloque de filas (n x áreas)
+
+        weights: +1 por fila agregada y -1 por fila quitada (por defecto +1)
+
+        Salida:
+            (conteo, suma, suma de cuadrados, histograma, conteo por categoría)
+        """
+        n_areas = len(self.areas)
+        scores = np.asarray(scores, dtype=np.float64).reshape(-1, n_areas)
+        weights = np.ones(len(scores)) if weights is None else np.asarray(weights, dtype=np.float64)
+        bins = np.clip(
+            ((scores - self.low) * (self.n_bins / (self.high - self.low))).astype(np.int64),
+            0, self.n_bins - 1
+        )
+        offsets = bins + np.arange(n_areas) * self.n_bins
+        histogram = np.bincount(offsets.ravel(), weights=np.repeat(weights, n_areas),
+                                minlength=n_areas * self.n_bins)
+        # Primera recomendación = categoría del área top (en empates, la primera listada)
+        top_category = self._area_category[np.argmax(scores, axis=1)] if len(scores) else \
+            np.empty(0, np.int64)
+        return (
+            int(weights.sum()),
+            weights @ scores,
+            weights @ (scores * scores),
+            np.rint(histogram).astype(np.int64).reshape(n_areas, self.n_bins),
+            np.rint(np.bincount(top_category, weights=weights,
+                                minlength=len(self.categories))).astype(np.int64)
+        )
+
+    def net_delta(self, added=None, removed=None):
+        """Delta de agregar unas filas y quitar otras (reemplazadas o eliminadas), en una pasada"""
+        blocks = [
+            (np.asarray(rows, dtype=np.float64).reshape(-1, len(self.areas)), sign)
+            for rows, sign in ((added, 1.0), (removed, -1.0)) if rows is not None
+        ]
+        scores = np.concatenate([rows for rows, _ in blocks] or [np.empty((0, len(self.areas)))])
+        weights = np.concatenate([np.full(len(rows), sign) for rows, sign in blocks] or [np.empty(0)])
+        return self.delta(scores, weights)
+
+    def apply(self, added=None, removed=None):
+        """Sumar las filas agregadas y restar las reemplazadas o eliminadas"""
+        n, total, total_sq, histogram, categories = self.net_delta(added, removed)
+        self.count += n
+        self.sum += total
+        self.sum_sq += total_sq
+        self.histogram += histogram
+        self.category_counts += categories
+
+    def merge(self, other):
+        """Sumar el estado de otros agregados con la misma configuración (p.ej. otra franja)"""
+        self.count += other.count
+        self.sum += other.sum
+        self.sum_sq += other.sum_sq
+        self.histogram += other.histogram
+        self.category_counts += other.category_counts
+        return self
+
+    # ==================== SERIALIZACIÓN ====================
+
+    def to_vector(self, delta=None):
+        """
+        Estado (o un delta de net_delta) como vector float64 plano, para
+        guardarlo como BLOB; los deltas se suman directamente sobre el vector
+        """
+        count, total, total_sq, histogram, categories = delta if delta is not None else (
+            self.count, self.sum, self.sum_sq, self.histogram, self.category_counts
+        )
+        return np.concatenate([[count], total, total_sq, histogram.ravel(), categories]).astype(np.float64)
+
+    def load_vector(self, vector):
+        """Restaurar el estado desde to_vector()"""
+        vector = np.asarray(vector, dtype=np.float64)
+        n_areas = len(self.areas)
+        sizes = [1, n_areas, n_areas, n_areas * self.n_bins, len(self.categories)]
+        if len(vector) != sum(sizes):
+            raise ValueError("El vector de agregados no coincide con la configuración")
+        bounds = np.cumsum([0] + sizes)
+        count, total, total_sq, histogram, categories = (
+            vector[start:end] for start, end in zip(bounds[:-1], bounds[1:])
+        )
+        self.count = int(round(count[0]))
+        self.sum = total.copy()
+        self.sum_sq = total_sq.copy()
+        self.histogram = np.rint(histogram).astype(np.int64).reshape(n_areas, self.n_bins)
+        self.category_counts = np.rint(categories).astype(np.int64)
+        return self
+
+    # ==================== RESUMEN ====================
+
+    def summary(self):
+        """Medias, desviaciones, histogramas y categorías sin recorrer los datos"""
+        n = self.count
+        if n > 0:
+            mean = self.sum / n
+            std = np.sqrt(np.maximum(self.sum_sq / n - mean ** 2, 0.0))
+        else:
+            mean = std = np.full(len(self.areas), np.nan)
+
+        edges = np.linspace(self.low, self.high, self.n_bins + 1)
+        return {
+            'total': int(n),
+            'areas': {
+                area.replace('PUNT_', ''): {
+                    'media': None if n == 0 else round(float(mean[j]), 4),
+                    'desviacion': None if n == 0 else round(float(std[j]), 4),
+                    'histograma': self.histogram[j].tolist()
+                }
+                for j, area in enumerate(self.areas)
+            },
+            'bordes_histograma': edges.tolist(),
+            'categoria_top': {cat: int(c) for cat, c in zip(self.categories, self.category_counts)}
+        }
@@ -5,21 +5,230 @@ Módulo de Análisis de Series Temporales y Predicción ARIMA (ACTUALIZADO)
 - Predicción con los 13 periodos disponibles
 """
 
+import os
+import json
+import inspect
+import time
+import warnings
+import threading
+import zlib
 import numpy as np
 import pandas as pd
+from itertools import product
+from concurrent.futures import ProcessPoolExecutor, wait
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import silhouette_score, davies_bouldin_score, calinski_harabasz_score
 from sklearn.decomposition import PCA
 from statsmodels.tsa.seasonal import seasonal_decompose
 from statsmodels.tsa.arima.model import ARIMA
 from statsmodels.tsa.stattools import adfuller
+from statsmodels.tools.sm_exceptions import MissingDataError
 from sklearn.metrics import mean_squared_error, mean_absolute_error
 
+try:
+    from .backtesting import backtest, ARIMAForecaster
+    from .baselines import series_matrix, forecast_all
+except ImportError:
+    from backtesting import backtest, ARIMAForecaster
+    from baselines import series_matrix, forecast_all
+
+
+# ==================== AJUSTE ARIMA (FUNCIONES DE MÓDULO) ====================
+
+# Fallos esperables al ajustar una serie: datos insuficientes o degenerados
+# (ValueError, MissingDataError) y optimización que no converge (LinAlgError).
+# Cualquier otra excepción es un error de programación y se propaga.
+ARIMA_FIT_ERRORS = (ValueError, MissingDataError, np.linalg.LinAlgError)
+
+def simulate_paths(fitted, steps, n_paths=2000, random_state=None):
+    """
+    Simular n_paths trayectorias futuras desde el estado final del modelo
+    (una sola llamada vectorizada al simulador de espacio de estados)
+    
+    Salida:
+        arreglo (n_paths, steps)
+    """
+    kwargs = {}
+    if random_state is not None:
+        # statsmodels >= 0.15 recibe la semilla como rng; antes, random_state
+        name = 'rng' if 'rng' in inspect.signature(fitted.simulate).parameters else 'random_state'
+        kwargs[name] = np.random.default_rng(random_state)
+    sims = fitted.simulate(nsimulations=steps, repetitions=n_paths, anchor='end', **kwargs)
+    return np.asarray(sims).reshape(steps, n_paths).T
+
+
+def path_intervals(paths, alpha=0.05):
+    """Cuantiles por paso de un arreglo (..., n_paths, steps)"""
+    lower, median, upper = np.quantile(paths, [alpha / 2, 0.5, 1 - alpha / 2], axis=-2)
+    return lower, median, upper
+
+
+def _fit_arima(ts_array, order=(1, 1, 1), test_size=3, horizon=0, alpha=0.05,
+               n_paths=0, random_state=None):
+    """
+    Ajustar ARIMA con holdout de los últimos test_size periodos
+    Si horizon > 0, reajusta con la serie completa y pronostica hacia adelante
+    Con n_paths > 0 los intervalos salen de trayectorias simuladas en lugar
+    de la fórmula analítica
+    Lanza excepción si la serie no sirve o el ajuste falla
+    """
+    ts_array = np.asarray(ts_array, dtype=np.float64).flatten()
+    if len(ts_array) < 4:
+        raise ValueError(f"Serie demasiado corta ({len(ts_array)} periodos)")
+    
+    # Validar que test_size no sea mayor que los datos disponibles
+    test_size = min(test_size, max(1, len(ts_array) - 1))
+    train_size = len(ts_array) - test_size
+    
+    train_ts = ts_array[:train_size]
+    test_ts = ts_array[train_size:]
+    
+    if len(train_ts) < 2 or len(test_ts) < 1:
+        raise ValueError("Particion train/test insuficiente")
+    
+    # Entrenar ARIMA y pronosticar el periodo de prueba
+    fitted = ARIMA(train_ts, order=order).fit()
+    forecast = fitted.get_forecast(steps=len(test_ts))
+    pred = np.asarray(forecast.predicted_mean).flatten()
+    
+    result = {
+        'model': fitted,
+        'train': train_ts,
+        'test': test_ts,
+        'predictions': pred,
+        'metrics': {
+            'rmse': np.sqrt(mean_squared_error(test_ts, pred)),
+            'mae': mean_absolute_error(test_ts, pred),
+            'mse': mean_squared_error(test_ts, pred)
+        },
+        'train_size': train_size,
+        'intervalo': 'simulacion' if n_paths > 0 else 'analitico'
+    }
+    
+    if n_paths > 0:
+        paths = simulate_paths(fitted, len(test_ts), n_paths, random_state)
+        result['pred_lower'], _, result['pred_upper'] = path_intervals(paths, alpha)
+    else:
+        conf_int = np.asarray(forecast.conf_int(alpha=alpha))
+        result['pred_lower'], result['pred_upper'] = conf_int[:, 0], conf_int[:, 1]
+    
+    if horizon > 0:
+        fitted_full = ARIMA(ts_array, order=order).fit()
+        future = fitted_full.get_forecast(steps=horizon)
+        result.update({
+            'model_full': fitted_full,
+            'forecast': np.asarray(future.predicted_mean).flatten()
+        })
+        if n_paths > 0:
+            paths = simulate_paths(fitted_full, horizon, n_paths, random_state)
+            result['forecast_lower'], _, result['forecast_upper'] = path_intervals(paths, alpha)
+        else:
+            conf_int = np.asarray(future.conf_int(alpha=alpha))
+            result['forecast_lower'], result['forecast_upper'] = conf_int[:, 0], conf_int[:, 1]
+    
+    return result
+
+
+def _fit_series_task(key, ts_array, order, test_size, horizon, alpha, keep_models, n_paths=0,
+                     random_state=None):
+    """Tarea del pool: ajustar una serie registrando los fallos de ajuste"""
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            result = _fit_arima(ts_array, order, test_size, horizon, alpha, n_paths, random_state)
+        if not keep_models:
+            result.pop('model', None)
+            result.pop('model_full', None)
+        result['estado'] = 'ok'
+        result['error'] = None
+    except ARIMA_FIT_ERRORS as e:
+        result = {'estado': 'error', 'error': f"{type(e).__name__}: {e}"}
+    
+    return key, result
+
+
+def _score_order_task(key, ts_array, order):
+    """Tarea del pool: ajustar un orden candidato y devolver AIC/BIC"""
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            fitted = ARIMA(ts_array, order=order).fit()
+        retvals = getattr(fitted, 'mle_retvals', None) or {}
+        converged = bool(retvals.get('converged', True))
+        converged = converged and np.isfinite(fitted.aic) and np.isfinite(fitted.bic)
+        return key, order, float(fitted.aic), float(fitted.bic), converged, None
+    except ARIMA_FIT_ERRORS as e:
+        return key, order, np.nan, np.nan, False, f"{type(e).__name__}: {e}"
+
+
+def _order_levels(p_values, d_values, q_values):
+    """Agrupar los órdenes candidatos por complejidad (p + q)"""
+    levels = {}
+    for p, d, q in product(p_values, d_values, q_values):
+        levels.setdefault(p + q, []).append((p, d, q))
+    return [levels[c] for c in sorted(levels)]
+
+
+def series_key(group, area):
+    """Clave textual de una serie (grupo | area)"""
+    return f"{group if group is not None else 'NACIONAL'}|{area}"
+
+
+def series_seed(random_state, key):
+    """
+    Semilla propia de cada serie derivada de random_state (None si no hay):
+    no depende del orden en que el pool procesa las series
+    """
+    if random_state is None:
+        return None
+    digest = zlib.crc32(series_key(*key).encode('utf-8'))
+    return int(np.random.SeedSequence([random_state, digest]).generate_state(1)[0])
+
+
+class OrderStore:
+    """Persistencia en JSON del orden ARIMA seleccionado por serie"""
+    
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._orders = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self._orders = json.load(f)
+    
+    def get_order(self, key, default=None):
+        """Orden guardado para la serie o default"""
+        entry = self._orders.get(key)
+        return tuple(entry['orden']) if entry else default
+    
+    def set_order(self, key, order, aic=None, bic=None, criterion='aic'):
+        """Guardar el orden seleccionado (escritura atómica)"""
+        with self._lock:
+            self._orders[key] = {
+                'orden': list(order),
+                'aic': aic,
+                'bic': bic,
+                'criterio': criterion,
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')
+            }
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._orders, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+    
+    def all(self):
+        return dict(self._orders)
+
 
 class AnalysisEngine:
     """Engine para análisis de clustering y series temporales"""
     
-    def __init__(self):
+    def __init__(self, cache=None):
+        # cache: ForecastCache opcional para reutilizar ajustes ARIMA
+        self.cache = cache
         self.X_scaled = None
         self.ts_values = None
         self.ts_periodos = None
@@ -154,50 +363,349 @@ class AnalysisEngine:
     
     # ==================== PREDICCIÓN ARIMA ====================
     
-    def train_arima(self, order=(1, 1, 1), test_size=3):
+    def train_arima(self, order=(1, 1, 1), test_size=3, alpha=0.05, n_paths=0):
         """
         Entrenar ARIMA con los periodos disponibles
         test_size: cuántos periodos finales usar para test/predicción
+        n_paths: trayectorias simuladas para el intervalo (0 = analítico)
+        Con self.cache, un resultado ya calculado para la misma serie, orden
+        y test_size se devuelve sin reentrenar (sin el objeto 'model')
+        Devuelve None si la serie es muy corta o el ajuste falla (se informa
+        el motivo); otros errores se propagan
         """
         if self.ts_values is None or len(self.ts_values) < 4:
             return None
         
-        ts_array = np.asarray(self.ts_values).flatten()
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(self.ts_values, order, test_size, alpha=alpha, n_paths=n_paths)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
         
-        # Validar que test_size no sea mayor que los datos disponibles
-        test_size = min(test_size, max(1, len(ts_array) - 1))
-        train_size = len(ts_array) - test_size
+        try:
+            result = _fit_arima(self.ts_values, order=order, test_size=test_size,
+                                alpha=alpha, n_paths=n_paths)
+        except ARIMA_FIT_ERRORS as e:
+            print(f"⚠️ ARIMA{tuple(order)} no se pudo ajustar: {type(e).__name__}: {e}")
+            return None
         
-        train_ts = ts_array[:train_size]
-        test_ts = ts_array[train_size:]
+        train_size = result['train_size']
+        result['test_periods'] = self.ts_periodos[train_size:] if self.ts_periodos is not None else None
         
-        if len(train_ts) < 2 or len(test_ts) < 1:
-            return None
+        if key is not None:
+            self.cache.put(key, result)
+        return result
+    
+    def build_series(self, df, areas, group_col=None, time_col='PERIODO'):
+        """
+        Construir todas las series por PERIODO con un solo groupby
+        
+        Salida:
+            diccionario {(grupo, area): pd.Series indexada por periodo}
+            grupo es None cuando no se desagrega por group_col
+        """
+        if group_col is None:
+            means = df.groupby(time_col)[areas].mean().sort_index()
+            return {(None, area): means[area].dropna() for area in areas}
+        
+        means = df.groupby([group_col, time_col])[areas].mean().sort_index()
+        series = {}
+        for group, block in means.groupby(level=0):
+            block = block.droplevel(0)
+            for area in areas:
+                series[(group, area)] = block[area].dropna()
+        return series
+    
+    def train_arima_batch(self, df, areas=None, group_col=None, order=(1, 1, 1), test_size=3,
+                          horizon=0, alpha=0.05, min_periods=5, n_jobs=None, keep_models=True,
+                          order_store=None, n_paths=0, random_state=None):
+        """
+        Entrenar ARIMA para todas las áreas (y opcionalmente cada grupo x área)
+        en un pool de procesos
+        
+        Cada serie se ajusta de forma aislada: un fallo de ajuste
+        (ARIMA_FIT_ERRORS) queda registrado en la tabla con estado 'error' y
+        su mensaje, sin afectar al resto; otros errores se propagan.
+        
+        Entrada:
+            df: DataFrame con PERIODO y columnas PUNT_*
+            areas: columnas a modelar (por defecto todas las PUNT_*)
+            group_col: p.ej. 'COLE_DEPTO_UBICACION' para series por departamento
+            horizon: periodos a pronosticar hacia adelante con la serie completa
+            order_store: OrderStore con órdenes seleccionados por serie
+                (las series sin orden guardado usan order)
+            n_paths: trayectorias simuladas por serie para los intervalos
+            random_state: semilla de las simulaciones (intervalos reproducibles;
+                cada serie usa series_seed(random_state, clave))
+        
+        Salida:
+            diccionario con 'resumen' (DataFrame de métricas y estado por serie)
+            y 'resultados' {(grupo, area): resultado de _fit_arima}
+        """
+        if areas is None:
+            areas = [col for col in df.columns if 'PUNT_' in col]
+        
+        series = self.build_series(df, areas, group_col=group_col)
+        results = {}
+        pending = {}
+        orders = {
+            key: order_store.get_order(series_key(*key), order) if order_store else tuple(order)
+            for key in series
+        }
+        
+        for key, ts in series.items():
+            if len(ts) < min_periods:
+                results[key] = {
+                    'estado': 'omitida',
+                    'error': f"Solo {len(ts)} periodos (minimo {min_periods})"
+                }
+            else:
+                pending[key] = ts.to_numpy(dtype=np.float64)
+        
+        if pending:
+            with ProcessPoolExecutor(max_workers=n_jobs or os.cpu_count()) as pool:
+                futures = [
+                    pool.submit(_fit_series_task, key, values, orders[key], test_size,
+                                horizon, alpha, keep_models, n_paths,
+                                series_seed(random_state, key))
+                    for key, values in pending.items()
+                ]
+                for future in futures:
+                    key, result = future.result()
+                    results[key] = result
+        
+        rows = []
+        for (group, area), result in results.items():
+            metrics = result.get('metrics', {})
+            rows.append({
+                'grupo': group,
+                'area': area,
+                'estado': result['estado'],
+                'orden': orders[(group, area)],
+                'n_periodos': len(series[(group, area)]),
+                'rmse': metrics.get('rmse'),
+                'mae': metrics.get('mae'),
+                'mse': metrics.get('mse'),
+                'error': result['error']
+            })
         
+        return {
+            'resumen': pd.DataFrame(rows),
+            'resultados': results
+        }
+    
+    # ==================== SELECCIÓN AUTOMÁTICA DE ORDEN ====================
+    
+    def _search_orders(self, series, p_values, d_values, q_values, criterion,
+                       time_budget, prune_delta, n_jobs):
+        """
+        Búsqueda de órdenes por niveles de complejidad para varias series
+        
+        Cada nivel (p + q) se evalúa en paralelo para todas las series. Para
+        cada d, la búsqueda deja de crecer cuando ningún candidato del nivel
+        converge o cuando el mejor del nivel empeora el criterio en más de
+        prune_delta. Al agotarse time_budget se cancelan los pendientes.
+        """
+        deadline = time.monotonic() + time_budget
+        records = {key: [] for key in series}
+        best = {key: {} for key in series}
+        pruned = {key: set() for key in series}
+        timed_out = False
+        
+        pool = ProcessPoolExecutor(max_workers=n_jobs or os.cpu_count())
         try:
-            # Entrenar ARIMA
-            model = ARIMA(train_ts, order=order)
-            fitted = model.fit()
-            
-            # Pronosticar
-            forecast = fitted.get_forecast(steps=len(test_ts))
-            pred = np.asarray(forecast.predicted_mean).flatten()
-            
-            # Métricas
-            metrics = {
-                'rmse': np.sqrt(mean_squared_error(test_ts, pred)),
-                'mae': mean_absolute_error(test_ts, pred),
-                'mse': mean_squared_error(test_ts, pred)
-            }
-            
-            return {
-                'model': fitted,
-                'train': train_ts,
-                'test': test_ts,
-                'predictions': pred,
-                'metrics': metrics,
-                'train_size': train_size,
-                'test_periods': self.ts_periodos[train_size:] if self.ts_periodos is not None else None
-            }
-        except Exception as e:
-            return None
\ No newline at end of file
+            for level in _order_levels(p_values, d_values, q_values):
+                futures = [
+                    pool.submit(_score_order_task, key, values, candidate)
+                    for key, values in series.items()
+                    for candidate in level
+                    if candidate[1] not in pruned[key]
+                ]
+                if not futures:
+                    break
+                
+                done, not_done = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+                
+                level_best = {key: {} for key in series}
+                for future in done:
+                    key, candidate, aic, bic, converged, error = future.result()
+                    records[key].append({
+                        'orden': candidate,
+                        'aic': aic,
+                        'bic': bic,
+                        'estado': 'ok' if converged else ('error' if error else 'no_converge'),
+                        'error': error
+                    })
+                    if converged:
+                        value = aic if criterion == 'aic' else bic
+                        d = candidate[1]
+                        level_best[key][d] = min(level_best[key].get(d, np.inf), value)
+                
+                if not_done:
+                    timed_out = True
+                    break
+                
+                # Poda por d: sin convergencia o claramente dominado por el nivel anterior
+                for key in series:
+                    for d in d_values:
+                        if d in pruned[key]:
+                            continue
+                        previous = best[key].get(d)
+                        current = level_best[key].get(d)
+                        if previous is not None and (current is None or current > previous + prune_delta):
+                            pruned[key].add(d)
+                        if current is not None:
+                            best[key][d] = min(current, previous if previous is not None else np.inf)
+        finally:
+            pool.shutdown(wait=not timed_out, cancel_futures=True)
+        
+        rankings = {}
+        for key, rows in records.items():
+            ranking = pd.DataFrame(rows, columns=['orden', 'aic', 'bic', 'estado', 'error'])
+            ranking['_ok'] = ranking['estado'] != 'ok'
+            ranking = ranking.sort_values(['_ok', criterion]).drop(columns='_ok').reset_index(drop=True)
+            rankings[key] = ranking
+        
+        return rankings, timed_out
+    
+    def select_order(self, ts_values=None, p_values=range(0, 3), d_values=range(0, 2),
+                     q_values=range(0, 3), criterion='aic', time_budget=60.0, prune_delta=10.0,
+                     n_jobs=None, key=None, store=None):
+        """
+        Seleccionar el orden (p, d, q) de una serie por AIC/BIC en paralelo
+        
+        Entrada:
+            ts_values: serie (por defecto self.ts_values)
+            key: clave de la serie para persistir el orden en store (OrderStore)
+        
+        Salida:
+            diccionario con 'mejor_orden', 'ranking' (DataFrame) y 'tiempo_agotado'
+        """
+        if ts_values is None:
+            ts_values = self.ts_values
+        if ts_values is None or len(ts_values) < 4:
+            return None
+        
+        batch = self.select_orders_batch(
+            {key: np.asarray(ts_values, dtype=np.float64)},
+            p_values=p_values, d_values=d_values, q_values=q_values,
+            criterion=criterion, time_budget=time_budget, prune_delta=prune_delta,
+            n_jobs=n_jobs, store=store if key is not None else None
+        )
+        return {
+            'mejor_orden': batch['mejores'].get(key),
+            'ranking': batch['rankings'][key],
+            'tiempo_agotado': batch['tiempo_agotado']
+        }
+    
+    def select_orders_batch(self, series, p_values=range(0, 3), d_values=range(0, 2),
+                            q_values=range(0, 3), criterion='aic', time_budget=60.0,
+                            prune_delta=10.0, n_jobs=None, store=None):
+        """
+        Seleccionar el orden de muchas series compartiendo un solo pool
+        
+        Entrada:
+            series: diccionario {clave: valores}; con claves (grupo, area) como
+                las de build_series, el orden se guarda en store por series_key
+        
+        Salida:
+            diccionario con 'mejores' {clave: orden}, 'rankings' y 'tiempo_agotado'
+        """
+        if criterion not in ('aic', 'bic'):
+            raise ValueError("criterion debe ser 'aic' o 'bic'")
+        
+        series = {
+            key: np.asarray(values, dtype=np.float64)
+            for key, values in series.items()
+            if len(values) >= 4
+        }
+        rankings, timed_out = self._search_orders(
+            series, list(p_values), list(d_values), list(q_values),
+            criterion, time_budget, prune_delta, n_jobs
+        )
+        
+        best_orders = {}
+        for key, ranking in rankings.items():
+            ok = ranking[ranking['estado'] == 'ok']
+            if ok.empty:
+                continue
+            top = ok.iloc[0]
+            best_orders[key] = tuple(top['orden'])
+            if store is not None:
+                store_key = series_key(*key) if isinstance(key, tuple) else str(key)
+                store.set_order(store_key, top['orden'], float(top['aic']),
+                                float(top['bic']), criterion)
+        
+        return {
+            'mejores': best_orders,
+            'rankings': rankings,
+            'tiempo_agotado': timed_out
+        }
+    
+    # ==================== PRONOSTICADORES BASE ====================
+    
+    def baseline_forecast_batch(self, df, areas=None, group_col=None, horizon=3, methods=None):
+        """
+        Pronosticar todas las series (grupo x área) con los métodos base
+        vectorizados en una sola llamada por método
+        
+        Salida:
+            DataFrame largo con grupo, area, metodo, horizonte y pronostico
+        """
+        if areas is None:
+            areas = [col for col in df.columns if 'PUNT_' in col]
+        
+        Y, keys, _ = series_matrix(self.build_series(df, areas, group_col=group_col))
+        forecasts = forecast_all(Y, horizon, methods)
+        
+        groups = np.array([key[0] for key in keys], dtype=object)
+        area_names = np.array([key[1] for key in keys], dtype=object)
+        frames = [
+            pd.DataFrame({
+                'grupo': np.repeat(groups, horizon),
+                'area': np.repeat(area_names, horizon),
+                'metodo': name,
+                'horizonte': np.tile(np.arange(1, horizon + 1), len(keys)),
+                'pronostico': values.ravel()
+            })
+            for name, values in forecasts.items()
+        ]
+        return pd.concat(frames, ignore_index=True)
+    
+    # ==================== BACKTESTING ====================
+    
+    def backtest_arima(self, df, areas=None, group_col=None, order=(1, 1, 1), horizon=3,
+                       min_train=6, window=None, refit_every=None, n_jobs=None, order_store=None):
+        """
+        Backtest de origen móvil de ARIMA para todas las áreas (o grupo x área)
+        
+        Con order_store cada serie usa su orden guardado. Ver backtesting.backtest
+        para el formato de salida.
+        """
+        if areas is None:
+            areas = [col for col in df.columns if 'PUNT_' in col]
+        
+        series = self.build_series(df, areas, group_col=group_col)
+        if order_store is None or not series:
+            # Sin series, backtest devuelve las tablas vacías con sus columnas
+            return backtest(series, ARIMAForecaster(order), horizon=horizon, min_train=min_train,
+                            window=window, refit_every=refit_every, n_jobs=n_jobs)
+        
+        # Un backtest por orden distinto para respetar el orden de cada serie
+        by_order = {}
+        for key, ts in series.items():
+            series_order = order_store.get_order(series_key(*key), tuple(order))
+            by_order.setdefault(series_order, {})[key] = ts
+        
+        partial = [
+            backtest(group, ARIMAForecaster(series_order), horizon=horizon, min_train=min_train,
+                     window=window, refit_every=refit_every, n_jobs=n_jobs)
+            for series_order, group in by_order.items()
+        ]
+        return {
+            'errores': pd.concat([p['errores'] for p in partial], ignore_index=True),
+            'resumen': pd.concat([p['resumen'] for p in partial], ignore_index=True),
+            'por_fold': pd.concat([p['por_fold'] for p in partial], ignore_index=True),
+            'fallos': [f for p in partial for f in p['fallos']]
+        }
@@ -0,0 +1,186 @@
+# backtesting.py
+"""
+Módulo de Backtesting con Origen Móvil
+- Evalúa cualquier pronosticador sobre orígenes expansivos o ventanas móviles
+- Ejecuta los folds en paralelo (bloques contiguos de orígenes por serie)
+- Reutiliza el estado ajustado cuando el modelo lo permite (ARIMA.append)
+- Distribución de RMSE/MAE por serie y por horizonte
+"""
+
+import os
+import copy
+import warnings
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from statsmodels.tsa.arima.model import ARIMA
+
+
+# ==================== PRONOSTICADORES ====================
+
+class ARIMAForecaster:
+    """ARIMA con actualización incremental del estado entre folds"""
+    
+    supports_update = True
+    
+    def __init__(self, order=(1, 1, 1)):
+        self.order = tuple(order)
+        self._result = None
+    
+    def fit(self, y):
+        self._result = ARIMA(np.asarray(y, dtype=np.float64), order=self.order).fit()
+        return self
+    
+    def update(self, new_y):
+        """Agregar observaciones conservando los parámetros ya estimados"""
+        self._result = self._result.append(np.asarray(new_y, dtype=np.float64), refit=False)
+        return self
+    
+    def forecast(self, steps):
+        return np.asarray(self._result.forecast(steps=steps)).flatten()
+
+
+class FunctionForecaster:
+    """Adaptador para funciones f(train, steps) -> pronóstico"""
+    
+    supports_update = False
+    
+    def __init__(self, func):
+        self.func = func
+        self._train = None
+    
+    def fit(self, y):
+        self._train = np.asarray(y, dtype=np.float64)
+        return self
+    
+    def forecast(self, steps):
+        return np.asarray(self.func(self._train, steps), dtype=np.float64).flatten()
+
+
+# ==================== FOLDS ====================
+
+def rolling_origins(n_periods, min_train=6, step=1):
+    """Orígenes (fin exclusivo del entrenamiento) con al menos 1 periodo de prueba"""
+    return list(range(min_train, n_periods, step))
+
+
+def _backtest_block(key, values, origins, prototype, horizon, window, refit_every):
+    """Tarea del pool: evaluar un bloque contiguo de orígenes de una serie"""
+    rows = []
+    failures = []
+    model = None
+    last_origin = None
+    updates = 0
+    
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for origin in origins:
+            start = 0 if window is None else max(0, origin - window)
+            try:
+                can_update = (
+                    model is not None
+                    and window is None
+                    and getattr(model, 'supports_update', False)
+                    and (refit_every is None or updates < refit_every)
+                )
+                if can_update:
+                    model.update(values[last_origin:origin])
+                    updates += 1
+                else:
+                    model = copy.deepcopy(prototype).fit(values[start:origin])
+                    updates = 0
+                
+                steps = min(horizon, len(values) - origin)
+                pred = model.forecast(steps)
+                actual = values[origin:origin + steps]
+                for h in range(steps):
+                    rows.append((key, origin, h + 1, actual[h], pred[h]))
+                last_origin = origin
+            except Exception as e:
+                model = None
+                failures.append({'serie': key, 'origen': origin, 'error': f"{type(e).__name__}: {e}"})
+    
+    return rows, failures
+
+
+def _split_blocks(origins, n_blocks):
+    """Partir los orígenes en bloques contiguos"""
+    n_blocks = max(1, min(n_blocks, len(origins)))
+    return [[int(o) for o in block] for block in np.array_split(origins, n_blocks) if len(block)]
+
+
+# ==================== BACKTEST ====================
+
+def backtest(series, forecaster, horizon=3, min_train=6, step=1, window=None,
+             refit_every=None, n_jobs=None):
+    """
+    Backtest de origen móvil para un conjunto de series
+    
+    Entrada:
+        series: diccionario {clave: valores} (p.ej. AnalysisEngine.build_series)
+        forecaster: objeto con fit(y)/forecast(steps) (y opcional update(new_y))
+            o función f(train, steps) definida a nivel de módulo (se envía al pool)
+        horizon: periodos pronosticados por origen
+        min_train: periodos de entrenamiento del primer origen
+        window: None para origen expansivo o tamaño de ventana móvil
+        refit_every: reajustar tras este número de actualizaciones incrementales
+    
+    Salida:
+        diccionario con 'errores' (un registro por origen y horizonte),
+        'resumen' (RMSE/MAE y cuantiles del error absoluto por serie y
+        horizonte), 'por_fold' (RMSE de cada origen) y 'fallos'
+    """
+    if callable(forecaster) and not hasattr(forecaster, 'fit'):
+        forecaster = FunctionForecaster(forecaster)
+    
+    series = {key: np.asarray(values, dtype=np.float64) for key, values in series.items()}
+    n_workers = n_jobs or os.cpu_count()
+    n_blocks = max(1, -(-n_workers // max(len(series), 1)))
+    
+    tasks = []
+    for key, values in series.items():
+        origins = rolling_origins(len(values), min_train=min_train, step=step)
+        for block in _split_blocks(origins, n_blocks):
+            tasks.append((key, values, block))
+    
+    rows = []
+    failures = []
+    if tasks:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = [
+                pool.submit(_backtest_block, key, values, block, forecaster,
+                            horizon, window, refit_every)
+                for key, values, block in tasks
+            ]
+            for future in futures:
+                block_rows, block_failures = future.result()
+                rows.extend(block_rows)
+                failures.extend(block_failures)
+    
+    errors = pd.DataFrame(rows, columns=['serie', 'origen', 'horizonte', 'real', 'pronostico'])
+    errors['error'] = errors['pronostico'] - errors['real']
+    errors['error_abs'] = errors['error'].abs()
+    errors['error_cuad'] = errors['error'] ** 2
+    
+    grouped = errors.groupby(['serie', 'horizonte'])
+    summary = grouped.agg(
+        n_folds=('error', 'size'),
+        rmse=('error_cuad', lambda x: float(np.sqrt(x.mean()))),
+        mae=('error_abs', 'mean'),
+        sesgo=('error', 'mean'),
+        error_abs_p10=('error_abs', lambda x: x.quantile(0.1)),
+        error_abs_p50=('error_abs', 'median'),
+        error_abs_p90=('error_abs', lambda x: x.quantile(0.9))
+    ).reset_index()
+    
+    per_fold = errors.groupby(['serie', 'origen']).agg(
+        rmse=('error_cuad', lambda x: float(np.sqrt(x.mean()))),
+        mae=('error_abs', 'mean')
+    ).reset_index()
+    
+    return {
+        'errores': errors.drop(columns='error_cuad'),
+        'resumen': summary,
+        'por_fold': per_fold,
+        'fallos': failures
+    }
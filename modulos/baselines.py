@@ -0,0 +1,242 @@
+# baselines.py
+"""
+Módulo de Pronosticadores Base Vectorizados
+- Operan sobre una matriz (series x periodos) en una sola llamada
+- Naive, deriva, media móvil, suavizado exponencial simple y Holt
+- Sirven como respaldo rápido y como referencia frente a ARIMA
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# ==================== PREPARACIÓN ====================
+
+def series_matrix(series):
+    """
+    Alinear un diccionario de series en una matriz (series x periodos)
+    
+    Entrada:
+        series: {clave: pd.Series indexada por periodo} (p.ej. build_series)
+    
+    Salida:
+        (Y, claves, periodos); los huecos se rellenan con el último valor
+        observado y los iniciales con el primero
+    """
+    # Columnas por posición: las claves (tuplas con grupo None) se devuelven
+    # tal cual, sin pasar por un MultiIndex
+    keys = list(series)
+    frame = pd.DataFrame({i: series[key] for i, key in enumerate(keys)}).sort_index()
+    frame = frame.ffill().bfill()
+    return frame.to_numpy(dtype=np.float64).T, keys, frame.index.to_numpy()
+
+
+def _as_matrix(Y):
+    Y = np.asarray(Y, dtype=np.float64)
+    return Y[None, :] if Y.ndim == 1 else Y
+
+
+def _steps(h):
+    return np.arange(1, h + 1, dtype=np.float64)[None, :]
+
+
+# ==================== MÉTODOS SIMPLES ====================
+
+def naive_forecast(Y, h, return_residuals=False):
+    """Último valor observado"""
+    Y = _as_matrix(Y)
+    forecast = np.repeat(Y[:, -1:], h, axis=1)
+    if return_residuals:
+        return forecast, Y[:, 1:] - Y[:, :-1]
+    return forecast
+
+
+def drift_forecast(Y, h, return_residuals=False):
+    """Último valor más la pendiente media entre el primer y el último periodo"""
+    Y = _as_matrix(Y)
+    n = Y.shape[1]
+    slope = (Y[:, -1] - Y[:, 0]) / max(n - 1, 1)
+    forecast = Y[:, -1:] + slope[:, None] * _steps(h)
+    if return_residuals:
+        return forecast, Y[:, 1:] - Y[:, :-1] - slope[:, None]
+    return forecast
+
+
+def moving_average_forecast(Y, h, window=3, return_residuals=False):
+    """Media de los últimos window periodos"""
+    Y = _as_matrix(Y)
+    window = max(1, min(window, Y.shape[1]))
+    forecast = np.repeat(Y[:, -window:].mean(axis=1, keepdims=True), h, axis=1)
+    if return_residuals:
+        # Media móvil de un paso vía suma acumulada
+        csum = np.cumsum(np.pad(Y, ((0, 0), (1, 0))), axis=1)
+        fitted = (csum[:, window:-1] - csum[:, :-window - 1]) / window
+        return forecast, Y[:, window:] - fitted
+    return forecast
+
+
+# ==================== SUAVIZADO EXPONENCIAL ====================
+
+DEFAULT_ALPHAS = np.linspace(0.05, 1.0, 20)
+DEFAULT_BETAS = np.linspace(0.0, 0.5, 11)
+
+
+def ses_forecast(Y, h, alphas=DEFAULT_ALPHAS, return_residuals=False, return_params=False):
+    """
+    Suavizado exponencial simple con alpha elegido por serie
+    
+    Todas las series y todos los alpha de la rejilla se filtran a la vez
+    (matriz series x alphas); se elige el alpha con menor error cuadrático
+    de un paso.
+    """
+    Y = _as_matrix(Y)
+    alphas = np.asarray(alphas, dtype=np.float64)[None, :]
+    n_series, n = Y.shape
+    
+    level = np.repeat(Y[:, :1], alphas.shape[1], axis=1)
+    errors = np.empty((n_series, alphas.shape[1], n - 1))
+    for t in range(1, n):
+        err = Y[:, t:t + 1] - level
+        errors[:, :, t - 1] = err
+        level = level + alphas * err
+    
+    best = np.argmin((errors ** 2).sum(axis=2), axis=1)
+    rows = np.arange(n_series)
+    forecast = np.repeat(level[rows, best][:, None], h, axis=1)
+    
+    output = [forecast]
+    if return_residuals:
+        output.append(errors[rows, best])
+    if return_params:
+        output.append({'alpha': alphas[0, best]})
+    return output[0] if len(output) == 1 else tuple(output)
+
+
+def holt_forecast(Y, h, alphas=DEFAULT_ALPHAS, betas=DEFAULT_BETAS,
+                  return_residuals=False, return_params=False):
+    """
+    Holt (nivel + tendencia) con (alpha, beta) elegidos por serie
+    
+    La rejilla completa de parámetros se evalúa de forma vectorizada sobre
+    todas las series (matriz series x combinaciones).
+    """
+    Y = _as_matrix(Y)
+    n_series, n = Y.shape
+    if n < 3:
+        # Muy corta para ajustar: deriva, sin parámetros elegidos (NaN)
+        result = drift_forecast(Y, h, return_residuals=return_residuals)
+        if not return_params:
+            return result
+        params = {'alpha': np.full(n_series, np.nan), 'beta': np.full(n_series, np.nan)}
+        return (*result, params) if return_residuals else (result, params)
+    
+    grid_alpha, grid_beta = np.meshgrid(np.asarray(alphas, dtype=np.float64),
+                                        np.asarray(betas, dtype=np.float64), indexing='ij')
+    a = grid_alpha.ravel()[None, :]
+    b = grid_beta.ravel()[None, :]
+    n_combos = a.shape[1]
+    
+    level = np.repeat(Y[:, 1:2], n_combos, axis=1)
+    trend = np.repeat(Y[:, 1:2] - Y[:, 0:1], n_combos, axis=1)
+    errors = np.zeros((n_series, n_combos, n - 2))
+    for t in range(2, n):
+        pred = level + trend
+        err = Y[:, t:t + 1] - pred
+        errors[:, :, t - 2] = err
+        new_level = pred + a * err
+        trend = trend + a * b * err
+        level = new_level
+    
+    best = np.argmin((errors ** 2).sum(axis=2), axis=1)
+    rows = np.arange(n_series)
+    forecast = level[rows, best][:, None] + trend[rows, best][:, None] * _steps(h)
+    
+    output = [forecast]
+    if return_residuals:
+        output.append(errors[rows, best])
+    if return_params:
+        output.append({'alpha': a[0, best], 'beta': b[0, best]})
+    return output[0] if len(output) == 1 else tuple(output)
+
+
+# ==================== INTERVALOS POR SIMULACIÓN ====================
+
+def bootstrap_paths(point_forecast, residuals, n_paths=2000, cumulative=True, random_state=None):
+    """
+    Trayectorias futuras para un lote de series remuestreando residuos
+    
+    Entrada:
+        point_forecast: (series x h) pronóstico puntual
+        residuals: (series x n_residuos) residuos de un paso (NaN se ignoran)
+        cumulative: acumular los errores a lo largo del horizonte (modelos
+            tipo paseo aleatorio: naive, deriva, SES, Holt)
+    
+    Salida:
+        arreglo (series x n_paths x h) generado en una sola operación
+    """
+    point_forecast = _as_matrix(point_forecast)
+    residuals = _as_matrix(residuals)
+    n_series, h = point_forecast.shape
+    rng = np.random.default_rng(random_state)
+    
+    # Residuos centrados; los NaN se reemplazan muestreando solo posiciones válidas
+    valid = ~np.isnan(residuals)
+    counts = np.maximum(valid.sum(axis=1), 1)
+    means = np.nanmean(np.where(valid, residuals, np.nan), axis=1, keepdims=True)
+    centered = np.where(valid, residuals - np.nan_to_num(means), 0.0)
+    order = np.argsort(~valid, axis=1, kind='stable')
+    compact = np.take_along_axis(centered, order, axis=1)
+    
+    draws = (rng.random((n_series, n_paths, h)) * counts[:, None, None]).astype(np.int64)
+    shocks = compact[np.arange(n_series)[:, None, None], draws]
+    if cumulative:
+        shocks = np.cumsum(shocks, axis=2)
+    return point_forecast[:, None, :] + shocks
+
+
+def bootstrap_intervals(point_forecast, residuals, n_paths=2000, alpha=0.05,
+                        cumulative=True, random_state=None):
+    """
+    Intervalos de predicción por bootstrap para todas las series a la vez
+    
+    Salida:
+        (inferior, mediana, superior), cada uno (series x h)
+    """
+    paths = bootstrap_paths(point_forecast, residuals, n_paths, cumulative, random_state)
+    lower, median, upper = np.quantile(paths, [alpha / 2, 0.5, 1 - alpha / 2], axis=1)
+    return lower, median, upper
+
+
+# ==================== REGISTRO ====================
+
+BASELINES = {
+    'naive': naive_forecast,
+    'deriva': drift_forecast,
+    'media_movil': moving_average_forecast,
+    'ses': ses_forecast,
+    'holt': holt_forecast
+}
+
+
+def forecast_all(Y, h, methods=None):
+    """Pronosticar todas las series con cada método base"""
+    methods = methods or list(BASELINES)
+    return {name: BASELINES[name](Y, h) for name in methods}
+
+
+class BaselineForecaster:
+    """Adaptador de un método base al protocolo fit/forecast del backtesting"""
+    
+    supports_update = False
+    
+    def __init__(self, method='deriva', **params):
+        self.method = method
+        self.params = params
+        self._train = None
+    
+    def fit(self, y):
+        self._train = np.asarray(y, dtype=np.float64)
+        return self
+    
+    def forecast(self, steps):
+        return BASELINES[self.method](self._train, steps, **self.params)[0]
@@ -4,14 +4,65 @@ Módulo de Clusterización
 Implementa KMeans, DBSCAN y Clustering Jerárquico
 """
 
+import os
 import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 from sklearn.cluster import KMeans, DBSCAN
+from sklearn.metrics import adjusted_rand_score
 from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
 from sklearn.neighbors import NearestNeighbors
 from scipy.cluster.hierarchy import linkage, fcluster
 
 
+# ==================== ESTABILIDAD (WORKERS) ====================
+
+# Vistas de los datos compartidos dentro de cada proceso worker
+_shared = {}
+
+
+def _to_shared(array):
+    """Copiar un arreglo a un bloque de memoria compartida"""
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def _attach_shared(specs):
+    """Inicializador del pool: adjuntar la memoria compartida sin copiar"""
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _shared[key] = (shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf))
+
+
+def _cluster_jaccard(ref_labels, boot_labels, k):
+    """Jaccard de cada cluster de referencia contra su mejor pareja bootstrap"""
+    contingency = np.bincount(
+        ref_labels * k + boot_labels, minlength=k * k
+    ).reshape(k, k)
+    ref_sizes = contingency.sum(axis=1)[:, None]
+    boot_sizes = contingency.sum(axis=0)[None, :]
+    union = ref_sizes + boot_sizes - contingency
+    jaccard = np.where(union > 0, contingency / np.maximum(union, 1), 0.0)
+    return jaccard.max(axis=1)
+
+
+def _stability_run(k, k_pos, seed, sample_frac, n_init, max_iter):
+    """Ajustar KMeans sobre una submuestra y compararla con la referencia"""
+    X = _shared['X'][1]
+    rng = np.random.default_rng(seed)
+    n = X.shape[0]
+    idx = np.sort(rng.choice(n, size=max(k + 1, int(n * sample_frac)), replace=False))
+    
+    kmeans = KMeans(n_clusters=k, random_state=seed, n_init=n_init, max_iter=max_iter)
+    boot_labels = kmeans.fit_predict(X[idx])
+    ref = _shared['refs'][1][k_pos, idx]
+    
+    return k, adjusted_rand_score(ref, boot_labels), _cluster_jaccard(ref, boot_labels, k)
+
+
 class ClusteringEngine:
     """Engine exclusivo para clustering"""
     
@@ -75,3 +126,142 @@ class ClusteringEngine:
             'X_pca': self.X_pca,
             'explained_variance': self.pca.explained_variance_ratio_
         }
+    
+    def profile_clusters(self, df, labels, score_cols, group_col='COLE_DEPTO_UBICACION', top_n=3,
+                         n_clusters=None):
+        """
+        Perfilar clusters sobre todo el dataset en una sola pasada vectorizada
+        
+        Entrada:
+            df: DataFrame completo (puntuaciones en unidades originales)
+            labels: etiqueta de cluster para cada fila de df
+            score_cols: columnas de puntuación a resumir
+            group_col: columna de departamento para el top de departamentos
+            top_n: cuántos departamentos reportar por cluster
+            n_clusters: número de clusters del modelo (p. ej. kmeans.n_clusters);
+                los clusters sin estudiantes aparecen con tamaño 0. Si es None
+                se deduce de la etiqueta mayor
+        
+        Salida:
+            DataFrame con una fila por cluster: tamaño, porcentaje,
+            media y desviación por área y top departamentos
+        """
+        labels = np.asarray(labels, dtype=np.int64)
+        if n_clusters is None:
+            n_clusters = int(labels.max()) + 1 if len(labels) else 0
+        X = df[score_cols].to_numpy(dtype=np.float64)
+        
+        # Tamaño, suma y suma de cuadrados por cluster con bincount
+        sizes = np.bincount(labels, minlength=n_clusters)
+        safe_sizes = np.maximum(sizes, 1)[:, None]
+        sums = np.column_stack([
+            np.bincount(labels, weights=X[:, j], minlength=n_clusters) for j in range(X.shape[1])
+        ])
+        sumsq = np.column_stack([
+            np.bincount(labels, weights=X[:, j] ** 2, minlength=n_clusters) for j in range(X.shape[1])
+        ])
+        means = sums / safe_sizes
+        variances = np.maximum(sumsq / safe_sizes - means ** 2, 0.0)
+        stds = np.sqrt(variances * sizes[:, None] / np.maximum(sizes - 1, 1)[:, None])
+        
+        profile = pd.DataFrame({
+            'Cluster': np.arange(n_clusters),
+            'Estudiantes': sizes,
+            'Porcentaje': np.round(sizes / max(len(labels), 1) * 100, 1)
+        })
+        for j, col in enumerate(score_cols):
+            area = col.replace('PUNT_', '')
+            profile[f'{area} (media)'] = np.round(means[:, j], 2)
+            profile[f'{area} (std)'] = np.round(stds[:, j], 2)
+        
+        # Top departamentos: conteo conjunto cluster x departamento en un solo bincount
+        if group_col in df.columns:
+            codes, departments = pd.factorize(df[group_col], sort=True)
+            valid = codes >= 0
+            n_depts = len(departments)
+            counts = np.bincount(
+                labels[valid] * n_depts + codes[valid],
+                minlength=n_clusters * n_depts
+            ).reshape(n_clusters, n_depts)
+            top_idx = np.argsort(-counts, axis=1, kind='stable')[:, :top_n]
+            top_counts = np.take_along_axis(counts, top_idx, axis=1)
+            profile['Top Departamentos'] = [
+                ', '.join(
+                    f"{departments[d]} ({c / max(sizes[i], 1) * 100:.0f}%)"
+                    for d, c in zip(top_idx[i], top_counts[i]) if c > 0
+                )
+                for i in range(n_clusters)
+            ]
+        
+        return profile
+    
+    def stability_analysis(self, X=None, k_range=range(2, 7), n_runs=20, sample_frac=0.8,
+                           n_jobs=None, random_state=42, n_init=5, max_iter=100):
+        """
+        Estabilidad de KMeans por k con submuestras en paralelo
+        
+        Para cada k se ajusta una clusterización de referencia sobre todos los
+        datos y n_runs clusterizaciones sobre submuestras sin reemplazo. Los
+        datos se publican una sola vez en memoria compartida y los ajustes se
+        reparten en un pool de procesos.
+        
+        Entrada:
+            X: matriz normalizada (por defecto self.X_scaled)
+        
+        Salida:
+            DataFrame con una fila por k: ARI medio/desviación y Jaccard
+            medio por cluster (estable si > 0.75, dudoso si < 0.6)
+        """
+        if X is None:
+            X = self.X_scaled
+        if X is None:
+            raise ValueError("Primero ejecuta prepare_data")
+        
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        k_values = list(k_range)
+        
+        references = np.vstack([
+            KMeans(n_clusters=k, random_state=random_state, n_init=n_init,
+                   max_iter=max_iter).fit_predict(X)
+            for k in k_values
+        ]).astype(np.int64)
+        
+        shm_X, spec_X = _to_shared(X)
+        shm_refs, spec_refs = _to_shared(references)
+        try:
+            seeds = np.random.SeedSequence(random_state).generate_state(len(k_values) * n_runs)
+            ari = {k: [] for k in k_values}
+            jaccard = {k: [] for k in k_values}
+            
+            with ProcessPoolExecutor(
+                max_workers=n_jobs or os.cpu_count(),
+                initializer=_attach_shared,
+                initargs=({'X': spec_X, 'refs': spec_refs},)
+            ) as pool:
+                futures = [
+                    pool.submit(_stability_run, k, i, int(seeds[i * n_runs + r]), sample_frac,
+                                n_init, max_iter)
+                    for i, k in enumerate(k_values)
+                    for r in range(n_runs)
+                ]
+                for future in futures:
+                    k, run_ari, run_jaccard = future.result()
+                    ari[k].append(run_ari)
+                    jaccard[k].append(run_jaccard)
+        finally:
+            for shm in (shm_X, shm_refs):
+                shm.close()
+                shm.unlink()
+        
+        rows = []
+        for k in k_values:
+            per_cluster = np.mean(jaccard[k], axis=0)
+            rows.append({
+                'k': k,
+                'ari_media': float(np.mean(ari[k])),
+                'ari_std': float(np.std(ari[k])),
+                'jaccard_min': float(per_cluster.min()),
+                'jaccard_por_cluster': np.round(per_cluster, 3).tolist()
+            })
+        
+        return pd.DataFrame(rows)
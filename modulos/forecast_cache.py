@@ -0,0 +1,130 @@
+# forecast_cache.py
+"""
+Caché persistente de ajustes y pronósticos ARIMA
+- Clave: huella de la serie + orden + test_size
+- Compartida entre sesiones y procesos (SQLite en disco)
+- Expulsión LRU e invalidación automática al refrescar los datos
+"""
+
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+
+def series_fingerprint(values):
+    """Huella estable de una serie numérica"""
+    array = np.ascontiguousarray(np.asarray(values, dtype=np.float64).ravel())
+    return hashlib.sha256(array.tobytes()).hexdigest()
+
+
+def file_version(path):
+    """Versión de un archivo de datos según tamaño y fecha de modificación"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return 'sin-datos'
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+class ForecastCache:
+    """Caché de resultados ARIMA respaldada por SQLite"""
+    
+    def __init__(self, path, max_entries=2000, data_version=None):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pronosticos (
+                clave TEXT PRIMARY KEY,
+                version_datos TEXT NOT NULL,
+                ultimo_acceso REAL NOT NULL,
+                resultado BLOB NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_pronosticos_acceso ON pronosticos (ultimo_acceso)"
+        )
+        self._conn.commit()
+        
+        self.data_version = None
+        if data_version is not None:
+            self.set_data_version(data_version)
+    
+    def set_data_version(self, data_version):
+        """Fijar la versión de datos vigente y descartar entradas de otras versiones"""
+        with self._lock:
+            self.data_version = data_version
+            self._conn.execute(
+                "DELETE FROM pronosticos WHERE version_datos != ?", (data_version,)
+            )
+            self._conn.commit()
+    
+    def make_key(self, values, order, test_size, **extra):
+        """Clave (huella de la serie, orden, test_size, parámetros extra)"""
+        parts = [series_fingerprint(values), repr(tuple(order)), str(test_size)]
+        parts += [f"{k}={extra[k]!r}" for k in sorted(extra)]
+        return '|'.join(parts)
+    
+    def get(self, key):
+        """Recuperar un resultado o None si no existe"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT resultado FROM pronosticos WHERE clave = ? AND version_datos = ?",
+                (key, self.data_version or '')
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE pronosticos SET ultimo_acceso = ? WHERE clave = ?",
+                (time.time(), key)
+            )
+            self._conn.commit()
+        return pickle.loads(row[0])
+    
+    def put(self, key, result):
+        """Guardar un resultado (sin objetos de modelo) y aplicar expulsión LRU"""
+        payload = {k: v for k, v in result.items() if k not in ('model', 'model_full')}
+        blob = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+        
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pronosticos VALUES (?, ?, ?, ?)",
+                (key, self.data_version or '', time.time(), blob)
+            )
+            self._conn.execute("""
+                DELETE FROM pronosticos WHERE clave IN (
+                    SELECT clave FROM pronosticos
+                    ORDER BY ultimo_acceso DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+            self._conn.commit()
+    
+    def get_or_compute(self, key, compute):
+        """Devolver el resultado en caché o calcularlo con compute() y guardarlo"""
+        result = self.get(key)
+        if result is None:
+            result = compute()
+            if result is not None:
+                self.put(key, result)
+        return result
+    
+    def clear(self):
+        """Vaciar la caché"""
+        with self._lock:
+            self._conn.execute("DELETE FROM pronosticos")
+            self._conn.commit()
+    
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pronosticos").fetchone()[0]
@@ -0,0 +1,327 @@
+# forecast_service.py
+"""
+Servicio de Pronósticos Precalculados
+- Calcula al refrescar los datos los pronósticos ARIMA de todas las áreas
+  (nacional y por departamento) con intervalos de confianza
+- Intervalos por simulación de trayectorias (ARIMA) o bootstrap de residuos
+  (deriva); el campo 'intervalo' indica cuál se usó
+- Respaldo con deriva cuando ARIMA falla para una serie
+- Entrega resultados listos para la API con ETag para peticiones condicionales
+- Publica los pronósticos en un archivo compartido: los demás procesos de la
+  API (workers de gunicorn) los recargan cuando cambia su versión
+"""
+
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+try:
+    from .analysis import AnalysisEngine, OrderStore
+    from .baselines import drift_forecast, bootstrap_intervals
+    from .forecast_cache import file_version
+except ImportError:
+    from analysis import AnalysisEngine, OrderStore
+    from baselines import drift_forecast, bootstrap_intervals
+    from forecast_cache import file_version
+
+
+def normalize_area(area):
+    """'matematicas' o 'PUNT_MATEMATICAS' -> 'PUNT_MATEMATICAS'"""
+    area = area.strip().upper()
+    return area if area.startswith('PUNT_') else f"PUNT_{area}"
+
+
+def normalize_group(group):
+    return group.strip().upper() if group else None
+
+
+def payload_etag(payload):
+    """ETag de un pronóstico: huella de su contenido serializado"""
+    body = json.dumps(payload, sort_keys=True, default=str)
+    return f'"{hashlib.sha1(body.encode("utf-8")).hexdigest()}"'
+
+
+class ForecastService:
+    """
+    Pronósticos precalculados por (departamento, área)
+    
+    Con shared_file, cada refresh escribe los pronósticos en ese archivo y
+    sync() carga los que haya escrito otro proceso, de modo que todos los
+    workers sirven los mismos pronósticos y ETags tras un refresh en uno solo.
+    """
+    
+    def __init__(self, csv_file, order=(1, 1, 1), horizon=3, alpha=0.05, n_paths=2000,
+                 group_col='COLE_DEPTO_UBICACION', orders_file=None, n_jobs=None, random_state=None,
+                 shared_file=None):
+        self.csv_file = csv_file
+        self.order = tuple(order)
+        self.horizon = horizon
+        self.alpha = alpha
+        self.n_paths = n_paths
+        self.group_col = group_col
+        self.orders_file = orders_file
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.shared_file = shared_file
+        
+        self._lock = threading.Lock()
+        self._shared_version = None     # (inodo, mtime, tamaño) del archivo compartido ya visto
+        self._forecasts = {}
+        self._versions = {}
+        self.etag = None
+        self.last_modified = None
+        self.data_version = None
+    
+    @property
+    def ready(self):
+        return self.etag is not None
+    
+    def refresh(self, df=None):
+        """
+        Recalcular todos los pronósticos
+        
+        Entrada:
+            df: DataFrame ya cargado (por defecto se lee csv_file)
+        
+        Salida:
+            número de series pronosticadas
+        """
+        version = file_version(self.csv_file)
+        if df is None:
+            df = pd.read_csv(self.csv_file, low_memory=False)
+        
+        areas = [col for col in df.columns if 'PUNT_' in col]
+        df = df.copy()
+        df[areas] = df[areas].apply(pd.to_numeric, errors='coerce')
+        
+        engine = AnalysisEngine()
+        order_store = OrderStore(self.orders_file) if self.orders_file else None
+        group_cols = [None]
+        if self.group_col in df.columns:
+            df[self.group_col] = df[self.group_col].astype(str).str.strip().str.upper()
+            group_cols.append(self.group_col)
+        
+        forecasts = {}
+        for group_col in group_cols:
+            batch = engine.train_arima_batch(
+                df, areas=areas, group_col=group_col, order=self.order,
+                horizon=self.horizon, alpha=self.alpha, n_jobs=self.n_jobs,
+                keep_models=False, order_store=order_store, n_paths=self.n_paths,
+                random_state=self.random_state
+            )
+            series = engine.build_series(df, areas, group_col=group_col)
+            fallback = self._drift_fallback(
+                {key: ts for key, ts in series.items() if batch['resultados'][key]['estado'] != 'ok'}
+            )
+            for row in batch['resumen'].itertuples(index=False):
+                key = (row.grupo, row.area)
+                payload = self._build_payload(
+                    key, series[key], batch['resultados'][key], row.orden, fallback.get(key)
+                )
+                if payload is not None:
+                    forecasts[key] = payload
+        
+        # ETag por pronóstico servido: cambia solo si cambia ese pronóstico
+        # (datos, órdenes guardados, semilla o parámetros); el ETag global
+        # resume todos y sirve de versión del conjunto
+        now = datetime.now(timezone.utc)
+        etags = {key: payload_etag(payload) for key, payload in forecasts.items()}
+        etag = payload_etag(sorted((group or '', area, tag) for (group, area), tag in etags.items()))
+        
+        with self._lock:
+            versions = {}
+            for key, tag in etags.items():
+                previous = self._versions.get(key)
+                versions[key] = previous if previous is not None and previous[0] == tag else (tag, now)
+            if etag != self.etag:
+                self.last_modified = now
+            self._forecasts = forecasts
+            self._versions = versions
+            self.data_version = version
+            self.etag = etag
+        
+        if self.shared_file:
+            self._publish()
+        return len(forecasts)
+    
+    # ==================== ARCHIVO COMPARTIDO ====================
+    
+    def _parameters(self):
+        """Parámetros que determinan los pronósticos (tipos JSON)"""
+        return {
+            'orden': list(self.order),
+            'horizonte': self.horizon,
+            'alpha': self.alpha,
+            'trayectorias': self.n_paths,
+            'departamentos': self.group_col,
+            'ordenes': self.orders_file,
+            'semilla': self.random_state
+        }
+    
+    def _publish(self):
+        """Escribir los pronósticos vigentes en shared_file (archivo temporal + renombrado)"""
+        with self._lock:
+            data = {
+                'version_datos': self.data_version,
+                'parametros': self._parameters(),
+                'etag': self.etag,
+                'ultima_modificacion': self.last_modified.isoformat(),
+                'pronosticos': [
+                    {
+                        'departamento': group,
+                        'area': area,
+                        'etag': etag,
+                        'ultima_modificacion': last_modified.isoformat(),
+                        'pronostico': self._forecasts[(group, area)]
+                    }
+                    for (group, area), (etag, last_modified) in self._versions.items()
+                ]
+            }
+        
+        directory = os.path.dirname(self.shared_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.shared_file}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+            f.flush()
+            stat = os.fstat(f.fileno())
+        os.replace(tmp, self.shared_file)
+        with self._lock:
+            self._shared_version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    
+    def sync(self):
+        """
+        Cargar los pronósticos de shared_file si cambiaron desde la última vez
+        
+        Se ignoran los calculados con otros datos o parámetros. El costo sin
+        cambios es un stat del archivo, así que se puede llamar por petición.
+        
+        Salida:
+            True si se cargaron pronósticos nuevos
+        """
+        if not self.shared_file:
+            return False
+        try:
+            stat = os.stat(self.shared_file)
+        except OSError:
+            return False
+        version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if version == self._shared_version:
+            return False
+        
+        try:
+            with open(self.shared_file) as f:
+                data = json.load(f)
+            stale = (data['version_datos'] != file_version(self.csv_file)
+                     or data['parametros'] != self._parameters())
+            forecasts, versions = {}, {}
+            for item in data['pronosticos']:
+                key = (item['departamento'], item['area'])
+                forecasts[key] = item['pronostico']
+                versions[key] = (item['etag'], datetime.fromisoformat(item['ultima_modificacion']))
+            last_modified = datetime.fromisoformat(data['ultima_modificacion'])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"⚠️ Pronósticos compartidos ilegibles ({self.shared_file}): {e}")
+            self._shared_version = version
+            return False
+        
+        with self._lock:
+            self._shared_version = version
+            if stale or data['etag'] == self.etag:
+                return False
+            self._forecasts = forecasts
+            self._versions = versions
+            self.data_version = data['version_datos']
+            self.etag = data['etag']
+            self.last_modified = last_modified
+        return True
+    
+    def _drift_fallback(self, series):
+        """
+        Deriva con intervalos bootstrap para todas las series sin ARIMA
+        (los intervalos del lote salen de una sola operación vectorizada)
+        """
+        series = {key: ts.to_numpy(dtype=np.float64) for key, ts in series.items() if len(ts) >= 2}
+        if not series:
+            return {}
+        
+        keys = list(series)
+        max_resid = max(len(values) for values in series.values()) - 1
+        means = np.empty((len(keys), self.horizon))
+        residuals = np.full((len(keys), max_resid), np.nan)
+        for i, key in enumerate(keys):
+            mean, resid = drift_forecast(series[key], self.horizon, return_residuals=True)
+            means[i] = mean[0]
+            residuals[i, :resid.shape[1]] = resid[0]
+        
+        lower, _, upper = bootstrap_intervals(means, residuals, n_paths=max(self.n_paths, 200),
+                                              alpha=self.alpha, random_state=self.random_state)
+        return {key: (means[i], lower[i], upper[i]) for i, key in enumerate(keys)}
+    
+    def _build_payload(self, key, ts, result, order, fallback=None):
+        """Respuesta lista para servir; deriva si ARIMA falló"""
+        group, area = key
+        values = ts.to_numpy(dtype=np.float64)
+        
+        if result.get('estado') == 'ok' and 'forecast' in result:
+            method = 'arima'
+            interval = 'simulacion' if self.n_paths > 0 else 'analitico'
+            mean = result['forecast']
+            lower = result['forecast_lower']
+            upper = result['forecast_upper']
+        elif fallback is not None:
+            method = 'deriva'
+            interval = 'bootstrap'
+            mean, lower, upper = fallback
+        else:
+            return None
+        
+        return {
+            'area': area.replace('PUNT_', ''),
+            'departamento': group,
+            'metodo': method,
+            'orden': list(order) if method == 'arima' else None,
+            'nivel_confianza': 1 - self.alpha,
+            'intervalo': interval,
+            'historico': {
+                'periodos': [str(p) for p in ts.index],
+                'valores': np.round(values, 4).tolist()
+            },
+            'pronostico': [
+                {
+                    'paso': i + 1,
+                    'valor': round(float(mean[i]), 4),
+                    'inferior': round(float(lower[i]), 4),
+                    'superior': round(float(upper[i]), 4)
+                }
+                for i in range(len(mean))
+            ],
+            'error_arima': result.get('error')
+        }
+    
+    def get(self, area, departamento=None):
+        """Pronóstico precalculado o None si no existe"""
+        with self._lock:
+            return self._forecasts.get((normalize_group(departamento), normalize_area(area)))
+    
+    def get_versioned(self, area, departamento=None):
+        """(pronóstico, ETag, última modificación) o None si no existe"""
+        key = (normalize_group(departamento), normalize_area(area))
+        with self._lock:
+            payload = self._forecasts.get(key)
+            if payload is None:
+                return None
+            etag, last_modified = self._versions[key]
+            return payload, etag, last_modified
+    
+    def available(self):
+        """Series disponibles"""
+        with self._lock:
+            return sorted(
+                (group or '', area.replace('PUNT_', '')) for group, area in self._forecasts
+            )
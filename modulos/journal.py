@@ -0,0 +1,339 @@
+# journal.py
+"""
+Módulo de Diario de Escrituras
+- Registro binario de solo anexado: cada alta, cambio o baja es un marco
+  (largo, crc32, contenido) en el segmento vigente
+- Instantáneas columnares periódicas (.npy) de los backends en memoria
+- Al iniciar se carga la última instantánea con mmap y solo se reaplica la
+  cola del registro posterior a ella
+"""
+
+import os
+import json
+import shutil
+import struct
+import threading
+import zlib
+from contextlib import ExitStack
+from datetime import datetime
+import numpy as np
+
+
+_UPSERT = 1
+_DELETE = 2
+_FRAME = struct.Struct('<II')       # largo del contenido, crc32 del contenido
+_HEADER = struct.Struct('<BIq')     # operación, filas, timestamp (µs desde 1970)
+_MANIFEST = 'instantanea.json'
+
+
+def _encode_ids(ids):
+    """Largos en bytes (uint32) y ids UTF-8 concatenados"""
+    encoded = [student_id.encode('utf-8') for student_id in ids]
+    lengths = np.fromiter(map(len, encoded), dtype='<u4', count=len(encoded))
+    return lengths, b''.join(encoded)
+
+
+def _decode_ids(lengths, blob):
+    bounds = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]).tolist()
+    blob = bytes(blob)
+    return [blob[start:end].decode('utf-8') for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+# ==================== REGISTRO ====================
+
+class MutationLog:
+    """
+    Segmentos registro-NNNNNNNN.bin de solo anexado
+
+    Un marco incompleto o con crc inválido al final de un segmento (escritura
+    cortada por una caída) termina la lectura de ese segmento.
+    """
+
+    def __init__(self, directory, fsync=False):
+        self.directory = directory
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._file = None
+        segments = self.segments()
+        self.segment = segments[-1] if segments else 0
+
+    def _path(self, segment):
+        return os.path.join(self.directory, f"registro-{segment:08d}.bin")
+
+    def segments(self):
+        """Números de segmento en disco, en orden"""
+        return sorted(
+            int(name[9:17]) for name in os.listdir(self.directory)
+            if name.startswith('registro-') and name.endswith('.bin')
+        )
+
+    def append(self, op, ids, scores=None, epoch=0):
+        """Anexar una operación (el archivo se abre al primer uso, también tras un fork)"""
+        lengths, blob = _encode_ids(ids)
+        payload = b''.join([
+            _HEADER.pack(op, len(lengths), int(epoch)),
+            lengths.tobytes(),
+            blob,
+            b'' if scores is None else np.ascontiguousarray(scores, dtype='<f4').tobytes()
+        ])
+        frame = _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            if self._file is None:
+                self._file = open(self._path(self.segment), 'ab')
+            self._file.write(frame)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def rotate(self):
+        """Cerrar el segmento vigente; las siguientes escrituras van a uno nuevo"""
+        with self._lock:
+            self._close_file()
+            self.segment += 1
+            return self.segment
+
+    def replay(self, start=0):
+        """(operación, ids, puntuaciones o None, timestamp) desde el segmento start"""
+        for segment in self.segments():
+            if segment >= start:
+                yield from self._read(segment)
+
+    def _read(self, segment):
+        with open(self._path(segment), 'rb') as f:
+            data = memoryview(f.read())
+        pos = 0
+        while pos + _FRAME.size <= len(data):
+            size, crc = _FRAME.unpack_from(data, pos)
+            payload = data[pos + _FRAME.size:pos + _FRAME.size + size]
+            if len(payload) < size or zlib.crc32(payload) != crc:
+                break
+            op, n, epoch = _HEADER.unpack_from(payload)
+            lengths = np.frombuffer(payload, dtype='<u4', count=n, offset=_HEADER.size)
+            start = _HEADER.size + lengths.nbytes
+            end = start + int(lengths.sum())
+            ids = _decode_ids(lengths, payload[start:end])
+            scores = None
+            if op == _UPSERT:
+                scores = np.frombuffer(payload, dtype='<f4', offset=end).reshape(n, -1)
+            yield op, ids, scores, epoch
+            pos += _FRAME.size + size
+        if pos < len(data):
+            print(f"⚠️ Registro {segment}: {len(data) - pos} bytes finales incompletos ignorados")
+
+    def drop_before(self, segment):
+        """Borrar los segmentos anteriores (ya cubiertos por una instantánea)"""
+        for old in self.segments():
+            if old < segment:
+                os.remove(self._path(old))
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        with self._lock:
+            self._close_file()
+
+
+# ==================== INSTANTÁNEAS ====================
+
+def save_snapshot(path, parts):
+    """
+    Escribir una instantánea columnar (directorio temporal + renombrado)
+
+    Entrada:
+        parts: lista de dicts con ids, scores (float32), timestamps (int64)
+            y aggregates (vector de RunningAggregates.to_vector)
+    """
+    tmp = path + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for k, part in enumerate(parts):
+        base = os.path.join(tmp, f"parte-{k:03d}")
+        lengths, blob = _encode_ids(part['ids'])
+        np.save(base + '.puntuaciones.npy', np.ascontiguousarray(part['scores'], dtype=np.float32))
+        np.save(base + '.timestamps.npy', np.ascontiguousarray(part['timestamps'], dtype=np.int64))
+        np.save(base + '.largos_ids.npy', lengths)
+        np.save(base + '.agregados.npy', np.asarray(part['aggregates'], dtype=np.float64))
+        with open(base + '.ids.bin', 'wb') as f:
+            f.write(blob)
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp, path)
+
+
+def load_snapshot(path):
+    """
+    Leer una instantánea; puntuaciones y timestamps quedan mapeados en
+    memoria con copia al escribir (mmap_mode='c'): el archivo no cambia
+    """
+    parts = []
+    k = 0
+    while os.path.exists(os.path.join(path, f"parte-{k:03d}.puntuaciones.npy")):
+        base = os.path.join(path, f"parte-{k:03d}")
+        with open(base + '.ids.bin', 'rb') as f:
+            ids = _decode_ids(np.load(base + '.largos_ids.npy'), f.read())
+        parts.append({
+            'ids': ids,
+            'scores': np.load(base + '.puntuaciones.npy', mmap_mode='c'),
+            'timestamps': np.load(base + '.timestamps.npy', mmap_mode='c'),
+            'aggregates': np.load(base + '.agregados.npy')
+        })
+        k += 1
+    return parts
+
+
+# ==================== DIARIO ====================
+
+class StoreJournal:
+    """
+    Durabilidad de un backend columnar (o particionado con franjas columnares)
+
+    El backend llama record_upsert / record_delete dentro de su candado, de
+    modo que el orden del registro coincide con el de la memoria para cada
+    estudiante. Cada snapshot_every filas registradas se escribe una
+    instantánea en segundo plano y se descartan los segmentos que cubre.
+    Las franjas de un backend particionado registran en paralelo: el conteo
+    de filas pendientes y la decisión de lanzar la instantánea van bajo
+    _pending_lock.
+    """
+
+    def __init__(self, directory, fsync=False, snapshot_every=1_000_000):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.log = MutationLog(directory, fsync=fsync)
+        self.manifest = None
+        self._store = None
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+
+    def _read_manifest(self):
+        path = os.path.join(self.directory, _MANIFEST)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def open(self, store):
+        """
+        Recuperar el backend (instantánea + cola del registro) y empezar a registrar
+
+        Salida:
+            (filas de la instantánea, operaciones reaplicadas del registro)
+        """
+        targets = store._columnar_parts()
+        self.manifest = self._read_manifest()
+        start = restored = 0
+        if self.manifest is not None:
+            parts = load_snapshot(os.path.join(self.directory, self.manifest['instantanea']))
+            if len(parts) == len(targets):
+                for target, part in zip(targets, parts):
+                    target.restore_columns(**part)
+            else:
+                # Cambió el número de franjas: se reparten las filas de nuevo
+                for part in parts:
+                    store._replay_upsert(part['ids'], part['scores'], part['timestamps'])
+            start = self.manifest['segmento']
+            restored = sum(len(part['ids']) for part in parts)
+
+        replayed = rows = 0
+        for op, ids, scores, epoch in self.log.replay(start):
+            if op == _UPSERT:
+                store._replay_upsert(ids, scores, epoch)
+            else:
+                for student_id in ids:
+                    store._replay_delete(student_id)
+            replayed += 1
+            rows += len(ids)
+        with self._pending_lock:
+            self._pending += rows
+
+        # La cola leída (quizá con un final cortado) no se vuelve a escribir; tras
+        # una instantánea puede no quedar ningún segmento en disco
+        self.log.segment = max(self.log.segment, start)
+        self.log.rotate()
+        self._store = store
+        store.journal = self
+        return restored, replayed
+
+    # ==================== ESCRITURAS ====================
+
+    def record_upsert(self, ids, scores, epoch):
+        self.log.append(_UPSERT, ids, scores, epoch)
+        self._count(len(ids))
+
+    def record_delete(self, student_id):
+        self.log.append(_DELETE, [student_id])
+        self._count(1)
+
+    def _count(self, rows):
+        with self._pending_lock:
+            self._pending += rows
+            due = self.snapshot_every and self._pending >= self.snapshot_every
+            # Una sola instantánea en curso: el resto de escritores no espera
+            if not (due and self._snapshot_lock.acquire(blocking=False)):
+                return
+        threading.Thread(target=self._snapshot_and_release, daemon=True).start()
+
+    # ==================== INSTANTÁNEAS ====================
+
+    def snapshot(self):
+        """Escribir una instantánea ahora (espera a la que esté en curso)"""
+        with self._snapshot_lock:
+            return self._snapshot()
+
+    def _snapshot_and_release(self):
+        try:
+            self._snapshot()
+        except Exception as e:
+            print(f"❌ Error escribiendo instantánea: {e}")
+        finally:
+            self._snapshot_lock.release()
+
+    def _snapshot(self):
+        parts = self._store._columnar_parts()
+        # Corte consistente: sin escrituras en curso mientras se copia y rota
+        with ExitStack() as stack:
+            for part in parts:
+                stack.enter_context(part._lock)
+            segment = self.log.rotate()
+            columns = [part.export_columns() for part in parts]
+            with self._pending_lock:
+                self._pending = 0
+
+        name = f"instantanea-{segment:08d}"
+        save_snapshot(os.path.join(self.directory, name), columns)
+        manifest = {
+            'instantanea': name,
+            'segmento': segment,
+            'filas': sum(len(part['ids']) for part in columns),
+            'creada': datetime.now().isoformat()
+        }
+        tmp = os.path.join(self.directory, _MANIFEST + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp, os.path.join(self.directory, _MANIFEST))
+        self.manifest = manifest
+
+        for old in os.listdir(self.directory):
+            if old.startswith('instantanea-') and old != name:
+                shutil.rmtree(os.path.join(self.directory, old), ignore_errors=True)
+        self.log.drop_before(segment)
+        return manifest
+
+    def close(self):
+        """Instantánea final si hubo escrituras desde la última y cerrar el registro"""
+        with self._pending_lock:
+            pending = self._pending
+        if self._store is not None and pending > 0:
+            self.snapshot()
+        self.log.close()
+
+    def stats(self):
+        return {
+            'segmento': self.log.segment,
+            'filas_desde_instantanea': self._pending,
+            'ultima_instantanea': self.manifest
+        }
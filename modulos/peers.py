@@ -0,0 +1,191 @@
+# peers.py
+"""
+Módulo de Recomendación por Pares
+- Índice KD-tree sobre los puntajes estandarizados de los estudiantes históricos
+- Se construye una sola vez (al iniciar o fuera de línea) y se guarda en disco
+- Las recomendaciones salen de las carreras sugeridas a los k estudiantes
+  con puntajes más parecidos (consultas en milisegundos, sin recorrer el dataset)
+"""
+
+import os
+import pickle
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+
+try:
+    from .forecast_cache import file_version
+except ImportError:
+    from forecast_cache import file_version
+
+
+class PeerIndex:
+    """Vecinos más cercanos entre estudiantes históricos"""
+
+    def __init__(self, engine, leaf_size=40):
+        self.engine = engine
+        self.areas = engine.areas_list
+        self.leaf_size = leaf_size
+
+        self.data_version = None
+        self.n_students = 0
+        self._tree = None
+        self._mean = None
+        self._std = None
+        self._scores = None
+        self._programs = None
+        self._peer_programs = None
+        self._program_category = None
+
+    @property
+    def ready(self):
+        return self._tree is not None
+
+    def build(self, df, data_version=None):
+        """
+        Construir el índice
+
+        Entrada:
+            df: DataFrame con las columnas de puntuación de engine.areas_list
+                (las filas con valores faltantes se descartan)
+
+        Salida:
+            número de estudiantes indexados
+        """
+        X = df[self.areas].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+        X = X[~np.isnan(X).any(axis=1)]
+        if len(X) == 0:
+            raise ValueError("No hay estudiantes con puntuaciones completas para indexar")
+
+        self._mean = X.mean(axis=0)
+        self._std = X.std(axis=0)
+        self._std[self._std == 0] = 1.0
+        self._tree = KDTree((X - self._mean) / self._std, leaf_size=self.leaf_size)
+        self._scores = X.astype(np.float32)
+
+        # Carreras sugeridas a cada estudiante histórico por las reglas (como índices)
+        frame = self.engine.get_recommendations_frame(X, include_reasons=False)
+        pairs = pd.concat([
+            frame[['carrera_1', 'categoria_carrera_1']].set_axis(['carrera', 'categoria'], axis=1),
+            frame[['carrera_2', 'categoria_carrera_2']].set_axis(['carrera', 'categoria'], axis=1)
+        ]).dropna().drop_duplicates('carrera')
+        self._programs = pairs['carrera'].to_numpy(dtype=object)
+        self._program_category = pairs['categoria'].to_numpy(dtype=object)
+
+        lookup = {program: i for i, program in enumerate(self._programs)}
+        self._peer_programs = np.column_stack([
+            frame[col].map(lookup).fillna(-1).to_numpy(dtype=np.int32)
+            for col in ('carrera_1', 'carrera_2')
+        ])
+
+        self.n_students = len(X)
+        self.data_version = data_version
+        return self.n_students
+
+    # ==================== PERSISTENCIA ====================
+
+    def save(self, path):
+        """Guardar el índice construido (escritura atómica)"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        state = {k: v for k, v in self.__dict__.items() if k != 'engine'}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """Cargar un índice guardado con save()"""
+        with open(path, 'rb') as f:
+            self.__dict__.update(pickle.load(f))
+        return self
+
+    @classmethod
+    def from_csv(cls, csv_file, engine, index_file=None, leaf_size=40):
+        """
+        Índice para csv_file, reutilizando index_file si corresponde a la
+        misma versión de los datos; si no, se construye y se guarda
+        """
+        version = file_version(csv_file)
+        index = cls(engine, leaf_size=leaf_size)
+
+        if index_file and os.path.exists(index_file):
+            try:
+                index.load(index_file)
+                if index.data_version == version:
+                    return index
+            except Exception:
+                pass
+            index = cls(engine, leaf_size=leaf_size)
+
+        df = pd.read_csv(csv_file, usecols=engine.areas_list, low_memory=False)
+        index.build(df, data_version=version)
+        if index_file:
+            index.save(index_file)
+        return index
+
+    # ==================== CONSULTAS ====================
+
+    def neighbors(self, scores_dict, k=50):
+        """Índices y distancias (en desviaciones estándar) de los k vecinos"""
+        if not self.ready:
+            raise RuntimeError("El índice de pares no está construido")
+
+        try:
+            x = np.array([float(scores_dict[area]) for area in self.areas])
+        except KeyError as e:
+            raise ValueError(f"Falta el área: {e.args[0]}")
+        if np.isnan(x).any():
+            raise ValueError("Las puntuaciones no pueden estar vacías")
+
+        k = max(1, min(int(k), self.n_students))
+        dist, idx = self._tree.query(((x - self._mean) / self._std)[None, :], k=k)
+        return idx[0], dist[0]
+
+    def recommend(self, scores_dict, k=50):
+        """
+        Recomendaciones a partir de los k estudiantes más parecidos
+
+        Entrada:
+            scores_dict: diccionario con las puntuaciones por área
+            k: tamaño del grupo de pares
+
+        Salida:
+            diccionario con el perfil del grupo de pares y 2 recomendaciones;
+            la relevancia es la fracción de pares a quienes las reglas les
+            sugieren esa carrera
+        """
+        idx, dist = self.neighbors(scores_dict, k=k)
+
+        peer_programs = self._peer_programs[idx].ravel()
+        peer_programs = peer_programs[peer_programs >= 0]
+        counts = np.bincount(peer_programs, minlength=len(self._programs))
+        share = counts / len(idx)
+        top = np.argsort(-counts, kind='stable')[:2]
+
+        recommendations = [
+            {
+                'posicion': position + 1,
+                'carrera': self._programs[i],
+                'categoria': self._program_category[i],
+                'razon': f"Sugerida al {share[i] * 100:.0f}% de los {len(idx)} estudiantes con puntajes más parecidos",
+                'relevancia': round(float(share[i]), 2)
+            }
+            for position, i in enumerate(top)
+            if counts[i] > 0
+        ]
+
+        peer_means = self._scores[idx].mean(axis=0)
+        return {
+            'estudiante_puntuaciones': scores_dict,
+            'pares': {
+                'k': int(len(idx)),
+                'distancia_media': round(float(dist.mean()), 4),
+                'distancia_max': round(float(dist.max()), 4),
+                'puntuaciones_medias': {
+                    area: round(float(value), 2) for area, value in zip(self.areas, peer_means)
+                }
+            },
+            'recomendaciones': recommendations
+        }
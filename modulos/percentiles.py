@@ -0,0 +1,104 @@
+# percentiles.py
+"""
+Módulo de Percentiles por Cohorte
+- Arreglos ordenados por área para la población nacional y cada departamento
+- Se construyen una vez a partir del dataset histórico
+- Cada consulta es una búsqueda binaria: O(log n) por área
+"""
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .forecast_service import normalize_group
+except ImportError:
+    from forecast_service import normalize_group
+
+
+class PercentileIndex:
+    """Rango percentil de un puntaje frente a la población histórica"""
+
+    def __init__(self, areas, group_col='COLE_DEPTO_UBICACION', min_cohort=30):
+        self.areas = list(areas)
+        self.group_col = group_col
+        self.min_cohort = min_cohort
+        self._sorted = {}
+
+    @property
+    def ready(self):
+        return None in self._sorted
+
+    def build(self, df):
+        """
+        Ordenar los puntajes de cada área por cohorte
+
+        Entrada:
+            df: DataFrame con las columnas de áreas y, opcionalmente, group_col
+                (los departamentos con menos de min_cohort estudiantes se omiten)
+
+        Salida:
+            número de cohortes (nacional + departamentos)
+        """
+        scores = df[self.areas].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float32)
+        cohorts = {None: np.arange(len(df))}
+        if self.group_col in df.columns:
+            groups = df[self.group_col].astype(str).str.strip().str.upper().to_numpy()
+            for group, idx in pd.Series(np.arange(len(df))).groupby(groups):
+                if len(idx) >= self.min_cohort:
+                    cohorts[group] = idx.to_numpy()
+
+        sorted_arrays = {}
+        for group, idx in cohorts.items():
+            block = np.sort(scores[idx], axis=0)
+            # NaN quedan al final de cada columna tras el ordenamiento
+            counts = (~np.isnan(block)).sum(axis=0)
+            sorted_arrays[group] = [block[:counts[j], j].copy() for j in range(len(self.areas))]
+
+        self._sorted = sorted_arrays
+        return len(sorted_arrays)
+
+    def groups(self):
+        """Departamentos con cohorte propia"""
+        return sorted(group for group in self._sorted if group is not None)
+
+    def cohort_size(self, departamento=None):
+        arrays = self._sorted.get(normalize_group(departamento))
+        return None if arrays is None else max(len(a) for a in arrays)
+
+    def percentiles(self, values, departamento=None):
+        """
+        Percentil (0-100) de cada puntaje frente a la cohorte
+
+        Se usa el rango medio: (# menores + # iguales / 2) / n, de modo que
+        los empates quedan en el centro de su bloque.
+
+        Entrada:
+            values: (n x áreas) o vector con los puntajes en el orden de areas
+            departamento: None para la cohorte nacional
+
+        Salida:
+            arreglo con la misma forma que values (NaN si no hay datos)
+        """
+        arrays = self._sorted.get(normalize_group(departamento))
+        if arrays is None:
+            raise KeyError(f"Sin cohorte para el departamento {departamento}")
+
+        values = np.asarray(values, dtype=np.float64)
+        matrix = values[None, :] if values.ndim == 1 else values
+        result = np.full(matrix.shape, np.nan)
+        for j, sorted_values in enumerate(arrays):
+            if len(sorted_values) == 0:
+                continue
+            left = np.searchsorted(sorted_values, matrix[:, j], side='left')
+            right = np.searchsorted(sorted_values, matrix[:, j], side='right')
+            result[:, j] = (left + right) / (2 * len(sorted_values)) * 100
+        result[np.isnan(matrix)] = np.nan
+        return result[0] if values.ndim == 1 else result
+
+    def student_percentiles(self, scores_dict, departamento=None):
+        """Percentiles por área de un estudiante ({área: percentil})"""
+        values = [scores_dict[area] for area in self.areas]
+        return {
+            area: round(float(p), 2)
+            for area, p in zip(self.areas, self.percentiles(values, departamento))
+        }
@@ -7,55 +7,21 @@ Genera 2 recomendaciones de carreras/facultades según desempeño
 
 import numpy as np
 import pandas as pd
+from itertools import permutations
+from config import AREA_MAPPING, FACULTY_PROGRAMS
+
+
+# Textos '%.0f' precalculados para puntuaciones enteras 0-100
+_SCORE_TEXT = np.array([f"{v:.0f}" for v in range(101)], dtype=object)
+
+# Fuente de la relevancia de cada regla: área top 1, área top 2 o promedio
+_FUENTE_TOP1, _FUENTE_TOP2, _FUENTE_PROMEDIO = 0, 1, 2
 
 
 class RecommendationEngine:
     """Engine para recomendar áreas de estudio según puntuaciones"""
     
     def __init__(self):
-        # Mapeo de áreas a categorías de facultades
-        self.area_to_category = {
-            'PUNT_INGLES': 'Humanidades',
-            'PUNT_MATEMATICAS': 'STEM',
-            'PUNT_SOCIALES_CIUDADANAS': 'Ciencias Sociales',
-            'PUNT_C_NATURALES': 'STEM',
-            'PUNT_LECTURA_CRITICA': 'Humanidades'
-        }
-        
-        # Facultades por categoría
-        self.category_to_programs = {
-            'STEM': [
-                'Ingeniería (Sistemas, Civil, Mecánica)',
-                'Ciencias de la Computación',
-                'Matemáticas Aplicadas',
-                'Biología / Bioquímica'
-            ],
-            'Ciencias Sociales': [
-                'Administración Pública',
-                'Economía / Contabilidad',
-                'Derecho',
-                'Sociología / Antropología'
-            ],
-            'Humanidades': [
-                'Filosofía / Literatura',
-                'Lingüística / Traducción',
-                'Historia / Arqueología',
-                'Comunicación Social'
-            ],
-            'Salud': [
-                'Medicina',
-                'Enfermería',
-                'Psicología',
-                'Salud Pública'
-            ],
-            'Artes': [
-                'Artes Plásticas',
-                'Música / Conservatorio',
-                'Cine / Audiovisuales',
-                'Diseño Gráfico'
-            ]
-        }
-        
         # Áreas de estudio normalizadas
         self.areas_list = [
             'PUNT_INGLES',
@@ -64,6 +30,72 @@ class RecommendationEngine:
             'PUNT_C_NATURALES',
             'PUNT_LECTURA_CRITICA'
         ]
+        
+        # Mapeo de áreas a categorías y facultades por categoría (config.py)
+        self.area_to_category = {area: AREA_MAPPING[area] for area in self.areas_list}
+        self.category_to_programs = FACULTY_PROGRAMS
+        
+        self._area_index = {area: i for i, area in enumerate(self.areas_list)}
+        self._compile_rules()
+    
+    def _compile_rules(self):
+        """
+        Precompilar las reglas para cada par ordenado (área top 1, área top 2)
+        
+        Solo el par top 2 decide la salida, así que basta una tabla de
+        5 x 4 = 20 entradas. Cada regla guarda la carrera, la categoría, el
+        texto fijo de la razón y de dónde sale la relevancia; en cada consulta
+        solo se sustituyen las puntuaciones. La tabla también se expone como
+        arreglos (indexados por top1 * 5 + top2) para el camino vectorizado.
+        
+        Lógica:
+        - Si ambas top áreas pertenecen a la misma categoría: 
+          generar 2 recomendaciones de esa categoría
+        - Si pertenecen a categorías diferentes:
+          1ra recomendación: categoría del área top 1
+          2da recomendación: categoría del área top 2
+        """
+        n_areas = len(self.areas_list)
+        names = [area.replace('PUNT_', '') for area in self.areas_list]
+        self._rules = {}
+        
+        for i, j in permutations(range(n_areas), 2):
+            cat_i = self.area_to_category[self.areas_list[i]]
+            cat_j = self.area_to_category[self.areas_list[j]]
+            rules = []
+            
+            if cat_i == cat_j:
+                programs = self.category_to_programs.get(cat_i, [])
+                if len(programs) >= 2:
+                    rules.append((1, programs[0], cat_i, f"Excelente desempeño en {names[i]} (", True, _FUENTE_TOP1))
+                    rules.append((2, programs[1], cat_i, f"Fuerte desempeño en {names[j]} (", True, _FUENTE_TOP2))
+                else:
+                    # Generar 1-2 recomendaciones si hay pocos programas
+                    for k, program in enumerate(programs[:2]):
+                        rules.append((k + 1, program, cat_i, f"Desempeño destacado en {cat_i}", False, _FUENTE_PROMEDIO))
+            else:
+                for k, (idx, category) in enumerate(((i, cat_i), (j, cat_j))):
+                    programs = self.category_to_programs.get(category, [])
+                    if programs:
+                        rules.append((k + 1, programs[0], category, f"Fuerte desempeño en {names[idx]} (", True, k))
+            
+            self._rules[(i, j)] = tuple(rules)
+        
+        # Versión en arreglos (n_areas^2 x 2) para get_recommendations_frame
+        size = n_areas * n_areas
+        self._table_program = np.full((size, 2), None, dtype=object)
+        self._table_category = np.full((size, 2), None, dtype=object)
+        self._table_prefix = np.full((size, 2), None, dtype=object)
+        self._table_with_score = np.zeros((size, 2), dtype=bool)
+        self._table_source = np.zeros((size, 2), dtype=np.int64)
+        for (i, j), rules in self._rules.items():
+            for k, (_, program, category, prefix, with_score, source) in enumerate(rules[:2]):
+                code = i * n_areas + j
+                self._table_program[code, k] = program
+                self._table_category[code, k] = category
+                self._table_prefix[code, k] = prefix
+                self._table_with_score[code, k] = with_score
+                self._table_source[code, k] = source
     
     def get_recommendations(self, scores_dict):
         """
@@ -91,11 +123,8 @@ class RecommendationEngine:
         # Obtener top 2 áreas con mayor puntuación
         top_2_areas = self._get_top_areas(scores_dict, top_n=2)
         
-        # Mapear áreas a categorías
-        top_categories = [self.area_to_category[area] for area, score in top_2_areas]
-        
-        # Generar recomendaciones
-        recommendations = self._generate_recommendations(top_2_areas, top_categories)
+        # Generar recomendaciones desde la tabla precompilada
+        recommendations = self._generate_recommendations(top_2_areas)
         
         return {
             'estudiante_puntuaciones': scores_dict,
@@ -119,65 +148,129 @@ class RecommendationEngine:
         # Retornar top N
         return sorted_areas[:top_n]
     
-    def _generate_recommendations(self, top_areas, categories):
+    def _generate_recommendations(self, top_areas, categories=None):
         """
-        Generar 2 recomendaciones basadas en áreas top y sus categorías
+        Generar 2 recomendaciones basadas en áreas top
         
-        Lógica:
-        - Si ambas top áreas pertenecen a la misma categoría: 
-          generar 2 recomendaciones de esa categoría
-        - Si pertenecen a categorías diferentes:
-          1ra recomendación: categoría del área top 1
-          2da recomendación: categoría del área top 2
+        Busca la entrada del par (top 1, top 2) en la tabla precompilada y
+        sustituye las puntuaciones (ver _compile_rules para la lógica).
+        categories se conserva por compatibilidad; la tabla ya lo resuelve.
         """
-        recommendations = []
+        (area_1, score_1), (area_2, score_2) = top_areas[:2]
+        rules = self._rules[(self._area_index[area_1], self._area_index[area_2])]
+        relevance_sources = (score_1 / 100, score_2 / 100, (score_1 + score_2) / 200)
+        scores = (score_1, score_2, None)
         
-        if categories[0] == categories[1]:
-            # Ambas áreas en la misma categoría
-            category = categories[0]
-            programs = self.category_to_programs.get(category, [])
-            
-            if len(programs) >= 2:
-                recommendations.append({
-                    'posicion': 1,
-                    'carrera': programs[0],
-                    'categoria': category,
-                    'razon': f"Excelente desempeño en {top_areas[0][0].replace('PUNT_', '')} ({top_areas[0][1]:.0f}/100)",
-                    'relevancia': round(min(top_areas[0][1] / 100, 1.0), 2)
-                })
-                recommendations.append({
-                    'posicion': 2,
-                    'carrera': programs[1],
-                    'categoria': category,
-                    'razon': f"Fuerte desempeño en {top_areas[1][0].replace('PUNT_', '')} ({top_areas[1][1]:.0f}/100)",
-                    'relevancia': round(min(top_areas[1][1] / 100, 1.0), 2)
-                })
-            else:
-                # Generar 1-2 recomendaciones si hay pocos programas
-                for i, program in enumerate(programs[:2]):
-                    recommendations.append({
-                        'posicion': i + 1,
-                        'carrera': program,
-                        'categoria': category,
-                        'razon': f"Desempeño destacado en {category}",
-                        'relevancia': round(min((top_areas[0][1] + top_areas[1][1]) / 200, 1.0), 2)
-                    })
+        return [
+            {
+                'posicion': position,
+                'carrera': program,
+                'categoria': category,
+                'razon': f"{prefix}{scores[source]:.0f}/100)" if with_score else prefix,
+                'relevancia': round(min(relevance_sources[source], 1.0), 2)
+            }
+            for position, program, category, prefix, with_score, source in rules
+        ]
+    
+    @staticmethod
+    def _format_scores(values):
+        """Formatear puntuaciones como '%.0f' usando una tabla para 0-100"""
+        rounded = np.rint(np.nan_to_num(values))
+        in_range = (rounded >= 0) & (rounded <= 100)
+        text = _SCORE_TEXT[np.clip(rounded, 0, 100).astype(np.int64)]
+        if not in_range.all():
+            text[~in_range] = np.char.mod('%.0f', rounded[~in_range]).astype(object)
+        return text
+    
+    @staticmethod
+    def _round_relevance(values):
+        """
+        round(x, 2) de Python, vectorizado
+        
+        np.round escala por 100 antes de redondear y falla en los casos que
+        quedan cerca de .xx5; esos pocos se redondean con round() sobre el
+        mismo valor.
+        """
+        scaled = values * 100
+        rounded = np.rint(scaled) / 100
+        near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+        if near_tie.any():
+            rounded[near_tie] = [round(v, 2) for v in values[near_tie].tolist()]
+        return rounded
+    
+    def get_recommendations_frame(self, scores, include_reasons=True):
+        """
+        Generar recomendaciones vectorizadas para muchos estudiantes
+        
+        Entrada:
+            scores: DataFrame con las columnas de self.areas_list o matriz (n x 5)
+                en ese mismo orden
+        
+        Salida:
+            DataFrame columnar con una fila por estudiante: top 2 áreas,
+            puntuaciones, categorías, carreras, relevancias y razones.
+            Las filas con puntuaciones faltantes quedan con valido=False.
+            include_reasons=False omite las columnas de texto (más rápido).
+        """
+        if isinstance(scores, pd.DataFrame):
+            missing = [area for area in self.areas_list if area not in scores.columns]
+            if missing:
+                raise ValueError(f"Falta el área: {missing[0]}")
+            index = scores.index
+            X = scores[self.areas_list].to_numpy(dtype=np.float64)
         else:
-            # Categorías diferentes
-            for i, (area, score) in enumerate(top_areas):
-                category = categories[i]
-                programs = self.category_to_programs.get(category, [])
-                
-                if programs:
-                    recommendations.append({
-                        'posicion': i + 1,
-                        'carrera': programs[0],
-                        'categoria': category,
-                        'razon': f"Fuerte desempeño en {area.replace('PUNT_', '')} ({score:.0f}/100)",
-                        'relevancia': round(min(score / 100, 1.0), 2)
-                    })
-        
-        return recommendations
+            X = np.asarray(scores, dtype=np.float64)
+            index = pd.RangeIndex(len(X))
+        
+        n = len(X)
+        valid = ~np.isnan(X).any(axis=1)
+        
+        # Top 2 por fila (orden estable: en empates gana el área listada primero)
+        top = np.argsort(-np.nan_to_num(X, nan=-np.inf), axis=1, kind='stable')[:, :2]
+        rows = np.arange(n)
+        top_scores = X[rows[:, None], top]
+        
+        area_names = np.array([area.replace('PUNT_', '') for area in self.areas_list], dtype=object)
+        area_categories = np.array([self.area_to_category[area] for area in self.areas_list], dtype=object)
+        
+        # Regla precompilada del par (top 1, top 2)
+        code = top[:, 0] * len(self.areas_list) + top[:, 1]
+        source = self._table_source[code]
+        # Mismas expresiones y mismo redondeo que _generate_recommendations
+        relevance_sources = np.column_stack([
+            top_scores[:, 0] / 100, top_scores[:, 1] / 100, (top_scores[:, 0] + top_scores[:, 1]) / 200
+        ])
+        relevance = self._round_relevance(
+            np.minimum(np.take_along_axis(relevance_sources, source, axis=1), 1.0)
+        )
+        program = self._table_program[code]
+        
+        columns = {
+            'valido': valid,
+            'area_1': area_names[top[:, 0]],
+            'puntuacion_1': top_scores[:, 0],
+            'categoria_1': area_categories[top[:, 0]],
+            'area_2': area_names[top[:, 1]],
+            'puntuacion_2': top_scores[:, 1],
+            'categoria_2': area_categories[top[:, 1]],
+            'carrera_1': program[:, 0],
+            'carrera_2': program[:, 1],
+            'categoria_carrera_1': self._table_category[code, 0],
+            'categoria_carrera_2': self._table_category[code, 1],
+            'relevancia_1': np.where(program[:, 0] != None, relevance[:, 0], np.nan),
+            'relevancia_2': np.where(program[:, 1] != None, relevance[:, 1], np.nan)
+        }
+        
+        if include_reasons:
+            prefix = self._table_prefix[code]
+            with_score = self._table_with_score[code]
+            for k in range(2):
+                # Las reglas con puntaje en la razón siempre citan el área top 1 o top 2
+                score_text = self._format_scores(top_scores[rows, np.minimum(source[:, k], 1)])
+                reason = np.where(with_score[:, k], prefix[:, k] + score_text + "/100)", prefix[:, k])
+                columns[f'razon_{k + 1}'] = np.where(program[:, k] != None, reason, None)
+        
+        return pd.DataFrame(columns, index=index)
     
     def get_recommendations_batch(self, df):
         """
@@ -188,23 +281,33 @@ class RecommendationEngine:
         
         Salida:
             lista de diccionarios con recomendaciones por estudiante
+            (para resultados columnares usar get_recommendations_frame)
         """
+        frame = self.get_recommendations_frame(df)
+        scores = df[self.areas_list]
         results = []
         
-        for idx, row in df.iterrows():
-            scores_dict = {
-                'PUNT_INGLES': row['PUNT_INGLES'],
-                'PUNT_MATEMATICAS': row['PUNT_MATEMATICAS'],
-                'PUNT_SOCIALES_CIUDADANAS': row['PUNT_SOCIALES_CIUDADANAS'],
-                'PUNT_C_NATURALES': row['PUNT_C_NATURALES'],
-                'PUNT_LECTURA_CRITICA': row['PUNT_LECTURA_CRITICA']
-            }
-            
-            try:
-                rec = self.get_recommendations(scores_dict)
-                results.append(rec)
-            except Exception as e:
-                print(f"Error procesando fila {idx}: {e}")
+        for idx in frame.index[~frame['valido'].to_numpy()]:
+            print(f"Error procesando fila {idx}: puntuaciones faltantes")
+        
+        valid = frame['valido'].to_numpy()
+        for row, score_row in zip(frame[valid].itertuples(index=False), scores[valid].to_dict('records')):
+            results.append({
+                'estudiante_puntuaciones': score_row,
+                'top_areas': [
+                    {'area': row.area_1, 'puntuacion': float(row.puntuacion_1), 'categoria': row.categoria_1},
+                    {'area': row.area_2, 'puntuacion': float(row.puntuacion_2), 'categoria': row.categoria_2}
+                ],
+                'recomendaciones': [
+                    {'posicion': position, 'carrera': program, 'categoria': category,
+                     'razon': reason, 'relevancia': float(relevance)}
+                    for position, program, category, reason, relevance in (
+                        (1, row.carrera_1, row.categoria_carrera_1, row.razon_1, row.relevancia_1),
+                        (2, row.carrera_2, row.categoria_carrera_2, row.razon_2, row.relevancia_2)
+                    )
+                    if program is not None
+                ]
+            })
         
         return results
     
@@ -0,0 +1,95 @@
+# response_cache.py
+"""
+Caché de Respuestas de Recomendación
+- Acotada en memoria con expulsión LRU
+- Clave: estudiante + variante de la consulta; cada entrada guarda la
+  versión de las puntuaciones con que se calculó
+- Invalidación explícita al actualizar o eliminar estudiantes
+- Contadores de aciertos y fallos
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class RecommendationCache:
+    """Respuestas calculadas por (estudiante, variante)"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._by_student = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, student_id, version, variant=None):
+        """Respuesta en caché o None si no existe o la versión cambió"""
+        key = (student_id, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, student_id, version, value, variant=None):
+        """Guardar una respuesta y expulsar las menos usadas"""
+        if self.max_entries <= 0:
+            return
+        key = (student_id, variant)
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            self._by_student.setdefault(student_id, set()).add(variant)
+            while len(self._entries) > self.max_entries:
+                (old_id, old_variant), _ = self._entries.popitem(last=False)
+                self._discard_index(old_id, old_variant)
+
+    def _discard_index(self, student_id, variant):
+        variants = self._by_student.get(student_id)
+        if variants is not None:
+            variants.discard(variant)
+            if not variants:
+                del self._by_student[student_id]
+
+    def invalidate(self, student_id):
+        """Descartar todas las variantes de un estudiante"""
+        with self._lock:
+            for variant in self._by_student.pop(student_id, ()):
+                self._entries.pop((student_id, variant), None)
+                self.invalidations += 1
+
+    def invalidate_many(self, student_ids):
+        """Descartar varios estudiantes (escrituras en bloque)"""
+        with self._lock:
+            if not self._by_student:
+                return
+            for student_id in student_ids:
+                for variant in self._by_student.pop(student_id, ()):
+                    self._entries.pop((student_id, variant), None)
+                    self.invalidations += 1
+
+    def clear(self):
+        """Vaciar la caché (conserva los contadores)"""
+        with self._lock:
+            self._entries.clear()
+            self._by_student.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entradas': len(self._entries),
+                'max_entradas': self.max_entries,
+                'aciertos': self.hits,
+                'fallos': self.misses,
+                'tasa_acierto': round(self.hits / total, 4) if total else None,
+                'invalidaciones': self.invalidations
+            }
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,902 @@
+# storage.py
+"""
+Módulo de Almacenamiento de Estudiantes
+- Interfaz común para los backends de la API (StudentStore)
+- Memoria: diccionario por estudiante (pruebas y desarrollo)
+- Columnar: columnas NumPy compactas (float32 / int64) con borrado lógico,
+  para mantener millones de estudiantes en memoria
+- Particionado: franjas en memoria por hash del id, cada una con su propio
+  candado, para escrituras concurrentes de muchos clientes
+- Columnar y particionado pueden llevar un diario (journal.py) para
+  recuperarse tras un reinicio
+- SQLite en modo WAL: persistente, compartido entre procesos, con pool de
+  conexiones y transacciones por lote para cargas masivas
+- Todos los backends mantienen agregados incrementales para /stats
+"""
+
+import os
+import zlib
+import heapq
+import queue
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager, ExitStack
+from itertools import islice
+from datetime import datetime, timedelta
+import numpy as np
+from config import AREA_MAPPING
+
+try:
+    from .aggregates import RunningAggregates
+    from .journal import StoreJournal
+except ImportError:
+    from aggregates import RunningAggregates
+    from journal import StoreJournal
+
+
+AREAS = [
+    'PUNT_INGLES',
+    'PUNT_MATEMATICAS',
+    'PUNT_SOCIALES_CIUDADANAS',
+    'PUNT_C_NATURALES',
+    'PUNT_LECTURA_CRITICA'
+]
+
+
+class StudentStore(ABC):
+    """
+    Interfaz de almacenamiento
+
+    Un registro es {área: puntuación, ..., 'timestamp_guardado': ISO 8601}.
+    Los backends implementan los métodos abstractos; upsert, iter_page,
+    __contains__ y stats tienen versiones genéricas que pueden sustituir.
+    """
+
+    areas = AREAS
+
+    @abstractmethod
+    def get(self, student_id):
+        """Registro del estudiante o None"""
+
+    @abstractmethod
+    def get_scores(self, student_ids):
+        """
+        Puntuaciones de varios estudiantes
+
+        Salida:
+            (máscara de encontrados alineada con student_ids,
+             matriz (encontrados x áreas) en el mismo orden)
+        """
+
+    def upsert(self, student_id, scores, timestamp):
+        """Crear o reemplazar un estudiante (scores en el orden de areas)"""
+        self.upsert_many([student_id], np.asarray([scores], dtype=np.float64), timestamp)
+
+    @abstractmethod
+    def upsert_many(self, student_ids, scores, timestamp):
+        """Crear o reemplazar un lote con un mismo timestamp"""
+
+    @abstractmethod
+    def delete(self, student_id):
+        """Eliminar un estudiante; False si no existía"""
+
+    @abstractmethod
+    def iter_students(self):
+        """(id, timestamp_guardado) de todos los estudiantes"""
+
+    def iter_page(self, after=None, limit=100, order_by='timestamp', descending=False,
+                  include_scores=False):
+        """
+        Página de estudiantes por llave (keyset)
+
+        Entrada:
+            after: (timestamp_guardado, id) del último elemento de la página
+                anterior (con order_by='id' solo se usa el id) o None
+            order_by: 'timestamp' (timestamp, id) o 'id'
+            include_scores: agregar las puntuaciones (lista en el orden de areas)
+
+        Salida:
+            generador de (id, timestamp_guardado, puntuaciones o None)
+        """
+        key = _page_key(order_by)
+        candidates = self.iter_students()
+        if after is not None:
+            after_key = key(tuple(after)[::-1])
+            candidates = (
+                item for item in candidates
+                if (key(item) < after_key if descending else key(item) > after_key)
+            )
+        select = heapq.nlargest if descending else heapq.nsmallest
+        items = select(limit, candidates, key=key)
+        yield from self._with_scores(items, include_scores)
+
+    def _with_scores(self, items, include_scores):
+        if not include_scores:
+            for student_id, timestamp in items:
+                yield student_id, timestamp, None
+            return
+        found, scores = self.get_scores([student_id for student_id, _ in items])
+        rows = iter(scores.tolist())
+        for (student_id, timestamp), ok in zip(items, found):
+            yield student_id, timestamp, next(rows) if ok else None
+
+    def __contains__(self, student_id):
+        return self.get(student_id) is not None
+
+    @abstractmethod
+    def __len__(self):
+        """Número de estudiantes guardados"""
+
+    def stats(self):
+        """Resumen de los agregados incrementales (ver RunningAggregates.summary)"""
+        summary = self.aggregates.summary()
+        journal = getattr(self, 'journal', None)
+        if journal is not None:
+            summary['diario'] = journal.stats()
+        return summary
+
+    def close(self):
+        pass
+
+    def _new_aggregates(self):
+        return RunningAggregates(self.areas, AREA_MAPPING)
+
+
+def _last_occurrence(student_ids):
+    """Posición de la última aparición de cada id en un lote (el último gana)"""
+    return {student_id: pos for pos, student_id in enumerate(student_ids)}
+
+
+def _page_key(order_by):
+    """Llave de orden sobre (id, timestamp) para la paginación"""
+    if order_by == 'timestamp':
+        return lambda item: (item[1], item[0])
+    if order_by == 'id':
+        return lambda item: item[0]
+    raise ValueError(f"Orden no soportado: {order_by}")
+
+
+# ==================== MEMORIA ====================
+
+class MemoryStudentStore(StudentStore):
+    """Diccionario de registros en memoria (se pierde al reiniciar)"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+        self.aggregates = self._new_aggregates()
+
+    def get(self, student_id):
+        record = self._data.get(student_id)
+        return None if record is None else record.copy()
+
+    def get_scores(self, student_ids):
+        records = [self._data.get(i) if isinstance(i, str) else None for i in student_ids]
+        found = np.array([r is not None for r in records], dtype=bool)
+        scores = np.array(
+            [[r[area] for area in self.areas] for r in records if r is not None], dtype=np.float64
+        ).reshape(-1, len(self.areas))
+        return found, scores
+
+    def upsert_many(self, student_ids, scores, timestamp):
+        scores = np.asarray(scores, dtype=np.float64).reshape(-1, len(self.areas))
+        latest = _last_occurrence(student_ids)
+        rows = scores[list(latest.values())]
+        with self._lock:
+            replaced = [
+                [self._data[i][area] for area in self.areas] for i in latest if i in self._data
+            ]
+            for student_id, row in zip(latest, rows.tolist()):
+                record = dict(zip(self.areas, row))
+                record['timestamp_guardado'] = timestamp
+                self._data[student_id] = record
+            self.aggregates.apply(added=rows, removed=np.asarray(replaced, dtype=np.float64))
+
+    def delete(self, student_id):
+        with self._lock:
+            record = self._data.pop(student_id, None)
+            if record is None:
+                return False
+            self.aggregates.apply(removed=np.array([[record[area] for area in self.areas]]))
+            return True
+
+    def iter_students(self):
+        for student_id, record in list(self._data.items()):
+            yield student_id, record['timestamp_guardado']
+
+    def __contains__(self, student_id):
+        return student_id in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
+# ==================== COLUMNAR ====================
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_epoch_us(timestamp):
+    """ISO 8601 (sin zona, como datetime.now().isoformat()) -> microsegundos"""
+    return (datetime.fromisoformat(timestamp) - _EPOCH) // _MICROSECOND
+
+
+def from_epoch_us(value):
+    """Microsegundos -> ISO 8601"""
+    return (_EPOCH + timedelta(microseconds=int(value))).isoformat()
+
+
+class ColumnarStudentStore(StudentStore):
+    """
+    Estudiantes en columnas NumPy que crecen por duplicación
+
+    - Puntuaciones float32 (n x áreas) y timestamps int64 (µs desde 1970)
+    - Índice id -> fila; los borrados marcan la fila como inactiva y se
+      compactan cuando superan la mitad de las filas usadas
+    - scores_view() expone la matriz sin copiarla
+    
+    Las puntuaciones se devuelven redondeadas a 4 decimales para no exponer
+    el ruido de float32.
+    """
+
+    journal = None
+
+    def __init__(self, initial_capacity=1024):
+        capacity = max(int(initial_capacity), 1)
+        self._scores = np.zeros((capacity, len(self.areas)), dtype=np.float32)
+        self._timestamps = np.zeros(capacity, dtype=np.int64)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._ids = np.empty(capacity, dtype=object)
+        self._index = {}
+        self._size = 0
+        self._lock = threading.RLock()
+        self.aggregates = self._new_aggregates()
+
+    def _reserve(self, extra):
+        needed = self._size + extra
+        capacity = len(self._timestamps)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ('_scores', '_timestamps', '_alive', '_ids'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype) if old.dtype != object \
+                else np.empty(capacity, dtype=object)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def get(self, student_id):
+        with self._lock:
+            row = self._index.get(student_id)
+            if row is None:
+                return None
+            scores = self._scores[row].astype(np.float64)
+            timestamp = self._timestamps[row]
+        record = dict(zip(self.areas, np.round(scores, 4).tolist()))
+        record['timestamp_guardado'] = from_epoch_us(timestamp)
+        return record
+
+    def get_scores(self, student_ids):
+        with self._lock:
+            rows = np.array(
+                [self._index.get(i, -1) if isinstance(i, str) else -1 for i in student_ids],
+                dtype=np.int64
+            )
+            found = rows >= 0
+            scores = self._scores[rows[found]].astype(np.float64)
+        return found, np.round(scores, 4)
+
+    def upsert_many(self, student_ids, scores, timestamp):
+        self._upsert_epoch(student_ids, scores, to_epoch_us(timestamp))
+
+    def _upsert_epoch(self, student_ids, scores, epoch):
+        """upsert_many con el timestamp en µs (uno para el lote o uno por fila)"""
+        scores = np.asarray(scores, dtype=np.float32).reshape(-1, len(self.areas))
+        epoch = np.asarray(epoch, dtype=np.int64)
+        with self._lock:
+            # Último valor gana si un id se repite en el lote
+            latest = _last_occurrence(student_ids)
+            existing = [(self._index[i], pos) for i, pos in latest.items() if i in self._index]
+            new = [(i, pos) for i, pos in latest.items() if i not in self._index]
+            self.aggregates.apply(
+                added=scores[list(latest.values())],
+                removed=self._scores[[row for row, _ in existing]] if existing else None
+            )
+
+            if existing:
+                rows, positions = map(list, zip(*existing))
+                self._scores[rows] = scores[positions]
+                self._timestamps[rows] = epoch if epoch.ndim == 0 else epoch[positions]
+
+            if new:
+                self._reserve(len(new))
+                start = self._size
+                end = start + len(new)
+                ids, positions = map(list, zip(*new))
+                self._scores[start:end] = scores[positions]
+                self._timestamps[start:end] = epoch if epoch.ndim == 0 else epoch[positions]
+                self._alive[start:end] = True
+                self._ids[start:end] = ids
+                self._index.update(zip(ids, range(start, end)))
+                self._size = end
+
+            if self.journal is not None:
+                self.journal.record_upsert(list(latest), scores[list(latest.values())], epoch)
+
+    def delete(self, student_id):
+        with self._lock:
+            row = self._index.pop(student_id, None)
+            if row is None:
+                return False
+            self.aggregates.apply(removed=self._scores[row:row + 1])
+            self._alive[row] = False
+            self._ids[row] = None
+            if self.journal is not None:
+                self.journal.record_delete(student_id)
+            if self._size - len(self._index) > max(self._size // 2, 1024):
+                self.compact()
+            return True
+
+    def compact(self):
+        """Eliminar las filas borradas y reconstruir el índice"""
+        with self._lock:
+            keep = np.flatnonzero(self._alive[:self._size])
+            n = len(keep)
+            for name in ('_scores', '_timestamps', '_alive', '_ids'):
+                column = getattr(self, name)
+                column[:n] = column[keep]
+            self._alive[n:self._size] = False
+            self._ids[n:self._size] = None
+            self._size = n
+            self._index = {student_id: row for row, student_id in enumerate(self._ids[:n])}
+
+    # ==================== DIARIO ====================
+
+    _replay_upsert = _upsert_epoch
+
+    def _replay_delete(self, student_id):
+        return self.delete(student_id)
+
+    def _columnar_parts(self):
+        return [self]
+
+    def export_columns(self):
+        """Copia de las filas activas para una instantánea (ver journal.save_snapshot)"""
+        with self._lock:
+            rows = np.flatnonzero(self._alive[:self._size])
+            return {
+                'ids': self._ids[rows].tolist(),
+                'scores': self._scores[rows],
+                'timestamps': self._timestamps[rows],
+                'aggregates': self.aggregates.to_vector()
+            }
+
+    def restore_columns(self, ids, scores, timestamps, aggregates=None):
+        """
+        Reemplazar el contenido por columnas ya cargadas (sin copiarlas: las
+        de journal.load_snapshot siguen mapeadas en memoria hasta que crecen)
+        """
+        if len(ids) == 0:
+            return
+        with self._lock:
+            n = len(ids)
+            self._scores = scores
+            self._timestamps = timestamps
+            self._alive = np.ones(n, dtype=bool)
+            self._ids = np.empty(n, dtype=object)
+            self._ids[:] = ids
+            self._index = dict(zip(ids, range(n)))
+            self._size = n
+            self.aggregates = self._new_aggregates()
+            if aggregates is not None:
+                self.aggregates.load_vector(aggregates)
+            else:
+                self.aggregates.apply(added=scores)
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+    def scores_view(self):
+        """
+        Matriz de puntuaciones sin copia
+
+        Salida:
+            (ids, puntuaciones float32, timestamps int64, máscara de activos),
+            vistas de las primeras filas usadas (incluye filas borradas)
+        """
+        with self._lock:
+            n = self._size
+            return self._ids[:n], self._scores[:n], self._timestamps[:n], self._alive[:n]
+
+    def iter_students(self):
+        ids, _, timestamps, alive = self.scores_view()
+        rows = np.flatnonzero(alive)
+        for student_id, timestamp in zip(ids[rows].tolist(), timestamps[rows].tolist()):
+            yield student_id, from_epoch_us(timestamp)
+
+    def iter_page(self, after=None, limit=100, order_by='timestamp', descending=False,
+                  include_scores=False):
+        """Paginación por timestamp vectorizada sobre las columnas (ver StudentStore)"""
+        if order_by != 'timestamp':
+            yield from super().iter_page(after, limit, order_by, descending, include_scores)
+            return
+
+        with self._lock:
+            ids, scores, timestamps, alive = self.scores_view()
+            rows = np.flatnonzero(alive)
+            ts = timestamps[rows]
+            if after is not None:
+                after_ts, after_id = to_epoch_us(after[0]), after[1]
+                ties = np.flatnonzero(ts == after_ts)
+                keep = (ts < after_ts) if descending else (ts > after_ts)
+                tie_ids = ids[rows[ties]]
+                keep[ties] = (tie_ids < after_id) if descending else (tie_ids > after_id)
+                rows, ts = rows[keep], ts[keep]
+
+            # Umbral del timestamp que cierra la página; solo se ordenan esas filas
+            if len(rows) > limit:
+                kth = -limit if descending else limit - 1
+                threshold = np.partition(ts, kth)[kth]
+                near = (ts >= threshold) if descending else (ts <= threshold)
+                rows, ts = rows[near], ts[near]
+            items = sorted(zip(ts.tolist(), ids[rows].tolist(), rows.tolist()), reverse=descending)[:limit]
+            selected = [row for _, _, row in items]
+            page_scores = np.round(scores[selected].astype(np.float64), 4).tolist() if include_scores else None
+
+        for i, (timestamp, student_id, _) in enumerate(items):
+            yield student_id, from_epoch_us(timestamp), page_scores[i] if include_scores else None
+
+    def __contains__(self, student_id):
+        return student_id in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def nbytes(self):
+        """Memoria aproximada de las columnas (sin el índice)"""
+        return self._scores.nbytes + self._timestamps.nbytes + self._alive.nbytes + self._ids.nbytes
+
+
+# ==================== PARTICIONADO ====================
+
+class ShardedStudentStore(StudentStore):
+    """
+    Estudiantes repartidos en franjas por crc32(id) % n_shards
+
+    - Cada franja es un backend en memoria (columnar o memoria) con su propio
+      candado: escrituras de estudiantes en franjas distintas no se esperan
+    - crc32 (y no hash()) para que la franja de un id no cambie entre procesos
+    - Listados, conteos y agregados toman los candados de todas las franjas,
+      siempre en el mismo orden, y leen un corte consistente
+    
+    Un lote que cae en varias franjas se escribe franja por franja.
+    """
+
+    SHARD_BACKENDS = ('columnar', 'memoria')
+
+    def __init__(self, n_shards=16, shard_backend='columnar', initial_capacity=1024):
+        if shard_backend not in self.SHARD_BACKENDS:
+            raise ValueError(f"Backend de franja no soportado: {shard_backend}")
+        n_shards = max(int(n_shards), 1)
+        if shard_backend == 'columnar':
+            capacity = max(int(initial_capacity) // n_shards, 1)
+            self._shards = [ColumnarStudentStore(initial_capacity=capacity) for _ in range(n_shards)]
+        else:
+            self._shards = [MemoryStudentStore() for _ in range(n_shards)]
+
+    @property
+    def n_shards(self):
+        return len(self._shards)
+
+    def _shard_of(self, student_id):
+        if not isinstance(student_id, str):
+            return 0
+        return zlib.crc32(student_id.encode('utf-8')) % len(self._shards)
+
+    def _group(self, student_ids):
+        """Posiciones de un lote agrupadas por franja"""
+        groups = {}
+        for pos, student_id in enumerate(student_ids):
+            groups.setdefault(self._shard_of(student_id), []).append(pos)
+        return groups
+
+    @contextmanager
+    def _all_locked(self):
+        """Candados de todas las franjas, en orden (evita bloqueos cruzados)"""
+        with ExitStack() as stack:
+            for shard in self._shards:
+                stack.enter_context(shard._lock)
+            yield
+
+    def get(self, student_id):
+        return self._shards[self._shard_of(student_id)].get(student_id)
+
+    def get_scores(self, student_ids):
+        student_ids = list(student_ids)
+        found = np.zeros(len(student_ids), dtype=bool)
+        scores = np.empty((len(student_ids), len(self.areas)))
+        for shard, positions in self._group(student_ids).items():
+            ok, rows = self._shards[shard].get_scores([student_ids[pos] for pos in positions])
+            positions = np.asarray(positions, dtype=np.int64)[ok]
+            found[positions] = True
+            scores[positions] = rows
+        return found, scores[found]
+
+    def upsert(self, student_id, scores, timestamp):
+        self._shards[self._shard_of(student_id)].upsert(student_id, scores, timestamp)
+
+    def upsert_many(self, student_ids, scores, timestamp):
+        scores = np.asarray(scores, dtype=np.float64).reshape(-1, len(self.areas))
+        student_ids = list(student_ids)
+        # Un id siempre cae en la misma franja, así que el último sigue ganando
+        for shard, positions in self._group(student_ids).items():
+            self._shards[shard].upsert_many(
+                [student_ids[pos] for pos in positions], scores[positions], timestamp
+            )
+
+    def delete(self, student_id):
+        return self._shards[self._shard_of(student_id)].delete(student_id)
+
+    def iter_students(self):
+        for shard in self._shards:
+            yield from shard.iter_students()
+
+    def iter_page(self, after=None, limit=100, order_by='timestamp', descending=False,
+                  include_scores=False):
+        """Mezcla de las páginas ordenadas de cada franja (ver StudentStore)"""
+        key = _page_key(order_by)
+        with self._all_locked():
+            pages = [
+                list(shard.iter_page(after, limit, order_by, descending, include_scores))
+                for shard in self._shards
+            ]
+        merged = heapq.merge(*pages, key=lambda item: key(item[:2]), reverse=descending)
+        yield from islice(merged, limit)
+
+    @property
+    def aggregates(self):
+        """Suma de los agregados de todas las franjas"""
+        total = self._new_aggregates()
+        with self._all_locked():
+            for shard in self._shards:
+                total.merge(shard.aggregates)
+        return total
+
+    def __contains__(self, student_id):
+        return student_id in self._shards[self._shard_of(student_id)]
+
+    # ==================== DIARIO ====================
+
+    @property
+    def journal(self):
+        return getattr(self._shards[0], 'journal', None)
+
+    @journal.setter
+    def journal(self, journal):
+        for shard in self._shards:
+            shard.journal = journal
+
+    def _columnar_parts(self):
+        if not isinstance(self._shards[0], ColumnarStudentStore):
+            raise ValueError("El diario requiere franjas columnares")
+        return list(self._shards)
+
+    def _replay_upsert(self, student_ids, scores, epoch):
+        scores = np.asarray(scores).reshape(-1, len(self.areas))
+        epoch = np.asarray(epoch, dtype=np.int64)
+        student_ids = list(student_ids)
+        for shard, positions in self._group(student_ids).items():
+            self._shards[shard]._replay_upsert(
+                [student_ids[pos] for pos in positions], scores[positions],
+                epoch if epoch.ndim == 0 else epoch[positions]
+            )
+
+    def _replay_delete(self, student_id):
+        return self.delete(student_id)
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+    def __len__(self):
+        with self._all_locked():
+            return sum(len(shard) for shard in self._shards)
+
+
+# ==================== SQLITE ====================
+
+class _ConnectionPool:
+    """Conexiones SQLite reutilizables entre hilos"""
+
+    def __init__(self, path, size=8):
+        self.path = path
+        self._pool = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._size = size
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                               isolation_level=None, cached_statements=128)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self._size
+                if can_create:
+                    self._created += 1
+            conn = self._connect() if can_create else self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def close(self):
+        """Cerrar las conexiones libres; el pool puede volver a usarse después"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
+
+
+class SQLiteStudentStore(StudentStore):
+    """
+    Estudiantes en SQLite (modo WAL)
+
+    - Lectores concurrentes con un escritor a la vez (también entre procesos)
+    - Sentencias parametrizadas (cacheadas por conexión)
+    - Cargas masivas en una sola transacción con executemany
+    - Agregados en la tabla 'agregados' (una fila), actualizados en la misma
+      transacción que los datos (coherentes entre procesos)
+    """
+
+    _COLUMNS = ', '.join(area.lower() for area in AREAS)
+    _UPSERT = (
+        f"INSERT OR REPLACE INTO estudiantes (estudiante_id, {_COLUMNS}, timestamp_guardado) "
+        f"VALUES (?{', ?' * len(AREAS)}, ?)"
+    )
+    _SELECT = f"SELECT {_COLUMNS}, timestamp_guardado FROM estudiantes WHERE estudiante_id = ?"
+    _LOOKUP_CHUNK = 500
+
+    def __init__(self, path, pool_size=8):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._pool = _ConnectionPool(path, size=pool_size)
+        self._write_lock = threading.Lock()
+        self._delta = self._new_aggregates()
+        with self._pool.connection() as conn:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS estudiantes (
+                    estudiante_id TEXT PRIMARY KEY,
+                    {', '.join(f'{area.lower()} REAL NOT NULL' for area in AREAS)},
+                    timestamp_guardado TEXT NOT NULL
+                ) WITHOUT ROWID
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_estudiantes_timestamp "
+                "ON estudiantes (timestamp_guardado, estudiante_id)"
+            )
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS agregados (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    estado BLOB NOT NULL
+                )
+            """)
+            try:
+                self._read_aggregates(conn)
+            except (TypeError, ValueError):
+                self._rebuild_aggregates(conn)
+
+    def _rebuild_aggregates(self, conn):
+        """Calcular los agregados desde cero (bases creadas sin ellos)"""
+        aggregates = self._new_aggregates()
+        cursor = conn.execute(f"SELECT {self._COLUMNS} FROM estudiantes")
+        while True:
+            rows = cursor.fetchmany(50000)
+            if not rows:
+                break
+            aggregates.apply(added=np.asarray(rows, dtype=np.float64))
+        conn.execute("BEGIN IMMEDIATE")
+        self._write_aggregates(conn, aggregates)
+        conn.execute("COMMIT")
+
+    def _read_aggregates(self, conn):
+        row = conn.execute("SELECT estado FROM agregados WHERE id = 0").fetchone()
+        if row is None:
+            raise ValueError("Sin agregados")
+        return self._new_aggregates().load_vector(np.frombuffer(row[0], dtype=np.float64))
+
+    def _write_aggregates(self, conn, aggregates):
+        conn.execute(
+            "INSERT OR REPLACE INTO agregados (id, estado) VALUES (0, ?)",
+            (aggregates.to_vector().tobytes(),)
+        )
+
+    def _fetch_scores(self, conn, keys):
+        """{id: fila de puntuaciones} para los ids existentes"""
+        found = {}
+        for start in range(0, len(keys), self._LOOKUP_CHUNK):
+            chunk = keys[start:start + self._LOOKUP_CHUNK]
+            query = (
+                f"SELECT estudiante_id, {self._COLUMNS} FROM estudiantes "
+                f"WHERE estudiante_id IN ({', '.join('?' * len(chunk))})"
+            )
+            for row in conn.execute(query, chunk):
+                found[row[0]] = row[1:]
+        return found
+
+    def get(self, student_id):
+        with self._pool.connection() as conn:
+            row = conn.execute(self._SELECT, (student_id,)).fetchone()
+        if row is None:
+            return None
+        record = dict(zip(self.areas, row[:-1]))
+        record['timestamp_guardado'] = row[-1]
+        return record
+
+    def get_scores(self, student_ids):
+        positions = {}
+        for pos, student_id in enumerate(student_ids):
+            if isinstance(student_id, str):
+                positions.setdefault(student_id, []).append(pos)
+
+        rows = np.full((len(student_ids), len(self.areas)), np.nan)
+        found = np.zeros(len(student_ids), dtype=bool)
+        with self._pool.connection() as conn:
+            for student_id, row in self._fetch_scores(conn, list(positions)).items():
+                for pos in positions[student_id]:
+                    rows[pos] = row
+                    found[pos] = True
+        return found, rows[found]
+
+    def upsert_many(self, student_ids, scores, timestamp):
+        scores = np.asarray(scores, dtype=np.float64).reshape(-1, len(self.areas))
+        latest = _last_occurrence(student_ids)
+        added = scores[list(latest.values())]
+        params = [(student_id, *row, timestamp) for student_id, row in zip(latest, added.tolist())]
+        
+        with self._write_lock, self._pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                replaced = list(self._fetch_scores(conn, list(latest)).values())
+                conn.executemany(self._UPSERT, params)
+                self._add_aggregates(conn, added, np.asarray(replaced, dtype=np.float64))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, student_id):
+        with self._write_lock, self._pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                removed = list(self._fetch_scores(conn, [student_id]).values())
+                if removed:
+                    conn.execute("DELETE FROM estudiantes WHERE estudiante_id = ?", (student_id,))
+                    self._add_aggregates(conn, None, np.asarray(removed, dtype=np.float64))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return bool(removed)
+
+    def _add_aggregates(self, conn, added, removed):
+        """Sumar el delta al vector de agregados dentro de la transacción abierta"""
+        delta = self._delta.to_vector(self._delta.net_delta(added, removed))
+        state = conn.execute("SELECT estado FROM agregados WHERE id = 0").fetchone()[0]
+        conn.execute(
+            "UPDATE agregados SET estado = ? WHERE id = 0",
+            ((np.frombuffer(state, dtype=np.float64) + delta).tobytes(),)
+        )
+
+    @property
+    def aggregates(self):
+        """Agregados vigentes leídos de la tabla (tamaño constante)"""
+        with self._pool.connection() as conn:
+            return self._read_aggregates(conn)
+
+    def iter_students(self):
+        with self._pool.connection() as conn:
+            rows = conn.execute("SELECT estudiante_id, timestamp_guardado FROM estudiantes").fetchall()
+        yield from rows
+
+    def iter_page(self, after=None, limit=100, order_by='timestamp', descending=False,
+                  include_scores=False):
+        """Paginación por llave con los índices de la tabla (ver StudentStore)"""
+        if order_by not in ('timestamp', 'id'):
+            raise ValueError(f"Orden no soportado: {order_by}")
+        columns = f"estudiante_id, timestamp_guardado{', ' + self._COLUMNS if include_scores else ''}"
+        key = "(timestamp_guardado, estudiante_id)" if order_by == 'timestamp' else "estudiante_id"
+        direction = "DESC" if descending else "ASC"
+        order = ', '.join(f"{col} {direction}" for col in key.strip('()').split(', '))
+
+        params = []
+        where = ""
+        if after is not None:
+            where = f"WHERE {key} {'<' if descending else '>'} {'(?, ?)' if order_by == 'timestamp' else '?'}"
+            params = list(after) if order_by == 'timestamp' else [after[1]]
+
+        query = f"SELECT {columns} FROM estudiantes {where} ORDER BY {order} LIMIT ?"
+        with self._pool.connection() as conn:
+            rows = conn.execute(query, params + [limit]).fetchall()
+        for row in rows:
+            yield row[0], row[1], list(row[2:]) if include_scores else None
+
+    def __contains__(self, student_id):
+        with self._pool.connection() as conn:
+            return conn.execute(
+                "SELECT 1 FROM estudiantes WHERE estudiante_id = ?", (student_id,)
+            ).fetchone() is not None
+
+    def __len__(self):
+        return self.aggregates.count
+
+    def close(self):
+        """
+        Cerrar las conexiones abiertas (también antes de un fork: cada proceso
+        hijo abre las suyas al primer uso)
+        """
+        self._pool.close()
+
+
+# ==================== FÁBRICA ====================
+
+BACKENDS = {
+    'memoria': MemoryStudentStore,
+    'columnar': ColumnarStudentStore,
+    'particionado': ShardedStudentStore,
+    'sqlite': SQLiteStudentStore
+}
+
+
+def create_store(config):
+    """
+    Crear el backend configurado
+
+    Entrada:
+        config: diccionario con 'backend' y sus parámetros (ver config.STORAGE)
+    """
+    backend = config.get('backend', 'sqlite')
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de almacenamiento desconocido: {backend}")
+    if backend == 'sqlite':
+        return SQLiteStudentStore(config['path'], pool_size=config.get('pool_size', 8))
+    if backend == 'columnar':
+        store = ColumnarStudentStore(initial_capacity=config.get('initial_capacity', 1024))
+    elif backend == 'particionado':
+        store = ShardedStudentStore(
+            n_shards=config.get('shards', 16),
+            shard_backend=config.get('shard_backend', 'columnar'),
+            initial_capacity=config.get('initial_capacity', 1024)
+        )
+    else:
+        store = BACKENDS[backend]()
+
+    if config.get('journal_dir'):
+        if backend not in ('columnar', 'particionado'):
+            raise ValueError(f"El diario no aplica al backend '{backend}' (use columnar o particionado)")
+        journal = StoreJournal(
+            config['journal_dir'],
+            fsync=config.get('journal_fsync', False),
+            snapshot_every=config.get('snapshot_every', 1_000_000)
+        )
+        journal.open(store)
+    return store
@@ -1,12 +1,24 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 from statsmodels.tsa.stattools import adfuller
-from statsmodels.tsa.arima.model import ARIMA
-from sklearn.metrics import mean_squared_error, mean_absolute_error
-from config import ARIMA as ARIMA_CONFIG
+from config import ARIMA as ARIMA_CONFIG, FORECAST_CACHE, CSV_FILE
+from modulos.analysis import AnalysisEngine, OrderStore, series_key
+from modulos.forecast_cache import ForecastCache, file_version
 from utils import plot_timeseries, plot_arima_prediction
 
+
+@st.cache_resource
+def _get_forecast_cache():
+    """Caché de pronósticos compartida por todas las sesiones"""
+    return ForecastCache(FORECAST_CACHE['path'], max_entries=FORECAST_CACHE['max_entries'])
+
+
+@st.cache_data(show_spinner=False)
+def _series_por_periodo(df_data, score_cols):
+    """Promedio por PERIODO de todas las areas (un solo groupby)"""
+    return df_data.groupby('PERIODO')[score_cols].mean().sort_index()
+
+
 def show_arima(df_data, score_cols):
     """Mostrar pagina de prediccion ARIMA"""
     st.header("Prediccion de Puntuaciones ICFES con ARIMA")
@@ -34,7 +46,7 @@ def show_arima(df_data, score_cols):
     
     # ==================== CREAR SERIE TEMPORAL ====================
     
-    ts_data = df_data.groupby('PERIODO')[selected_area].mean().sort_index()
+    ts_data = _series_por_periodo(df_data, score_cols)[selected_area].dropna()
     
     if len(ts_data) < ARIMA_CONFIG['min_periods']:
         st.error(f"No hay suficientes periodos para ARIMA (se necesitan al menos {ARIMA_CONFIG['min_periods']})")
@@ -78,25 +90,56 @@ def show_arima(df_data, score_cols):
     
     st.markdown("#### Prediccion ARIMA")
     
+    auto_order = st.checkbox(
+        f"Seleccion automatica del orden ({ARIMA_CONFIG['order_search']['criterion'].upper()})",
+        value=False,
+        help="Busca (p, d, q) en paralelo y guarda el orden elegido para esta area"
+    )
+    
     if st.button("Generar Prediccion ARIMA", type="primary", use_container_width=True):
         
         with st.spinner("Entrenando modelo ARIMA..."):
             try:
                 test_size = min(ARIMA_CONFIG['test_size'], len(ts_data) // 3)
-                train = ts_data[:-test_size]
-                test = ts_data[-test_size:]
                 
-                # Entrenar ARIMA
-                model = ARIMA(train, order=ARIMA_CONFIG['order'])
-                fitted_model = model.fit()
+                # Cache invalidada automaticamente si cambia el archivo de datos
+                cache = _get_forecast_cache()
+                version = file_version(CSV_FILE)
+                if cache.data_version != version:
+                    cache.set_data_version(version)
+                
+                engine = AnalysisEngine(cache=cache)
+                engine.ts_values = ts_data.values
+                engine.ts_periodos = ts_data.index.values
+                
+                order = ARIMA_CONFIG['order']
+                if auto_order:
+                    store = OrderStore(ARIMA_CONFIG['orders_file'])
+                    key = series_key(None, selected_area)
+                    order = store.get_order(key)
+                    if order is None:
+                        selection = engine.select_order(key=key, store=store, **ARIMA_CONFIG['order_search'])
+                        order = (selection or {}).get('mejor_orden') or ARIMA_CONFIG['order']
+                    st.info(f"Orden seleccionado: {order}")
+                
+                result = engine.train_arima(
+                    order=order,
+                    test_size=test_size,
+                    alpha=ARIMA_CONFIG['alpha'],
+                    n_paths=ARIMA_CONFIG['n_paths']
+                )
+                
+                if result is None:
+                    raise ValueError("No se pudo entrenar ARIMA para esta serie")
                 
-                # Predecir
-                predictions = fitted_model.forecast(steps=test_size)
+                train = pd.Series(result['train'])
+                test = pd.Series(result['test'])
+                predictions = pd.Series(result['predictions'])
                 
                 # Calcular metricas
-                rmse = np.sqrt(mean_squared_error(test, predictions))
-                mae = mean_absolute_error(test, predictions)
-                mse = mean_squared_error(test, predictions)
+                rmse = result['metrics']['rmse']
+                mae = result['metrics']['mae']
+                mse = result['metrics']['mse']
                 
                 st.success("Modelo ARIMA entrenado")
                 
@@ -115,7 +158,14 @@ def show_arima(df_data, score_cols):
                 
                 # ==================== GRAFICO PREDICCION ====================
                 
-                fig_pred = plot_arima_prediction(train, test, predictions)
+                fig_pred = plot_arima_prediction(
+                    train, test, predictions,
+                    lower=result['pred_lower'], upper=result['pred_upper']
+                )
+                st.caption(
+                    f"Intervalo de prediccion al {(1 - ARIMA_CONFIG['alpha']) * 100:.0f}% "
+                    f"a partir de {ARIMA_CONFIG['n_paths']} trayectorias simuladas"
+                )
                 st.plotly_chart(fig_pred, use_container_width=True)
                 
                 # ==================== INTERPRETACION ====================
@@ -127,6 +177,7 @@ def show_arima(df_data, score_cols):
                         <li><strong>Linea Azul (Entrenamiento):</strong> Datos historicos usados para entrenar</li>
                         <li><strong>Linea Naranja (Real):</strong> Valores reales del periodo final</li>
                         <li><strong>Linea Verde (Prediccion):</strong> Lo que el modelo predice</li>
+                        <li><strong>Banda Verde (Intervalo):</strong> Rango probable del valor real</li>
                     </ul>
                     <p><strong>Nota:</strong> Con pocos periodos, ARIMA muestra tendencias generales.</p>
                 </div>
@@ -5,6 +5,7 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.cluster import KMeans
 from sklearn.decomposition import PCA
 from config import CLUSTERING
+from modulos.clustering import ClusteringEngine
 from utils import plot_scatter_clusters, plot_cluster_distribution
 
 def show_clustering(df_data, score_cols):
@@ -97,17 +98,31 @@ def show_clustering(df_data, score_cols):
     
     st.markdown("#### Estadisticas por Cluster")
     
-    cluster_stats = []
-    for cluster_id in range(k_optimal):
-        cluster_mask = labels == cluster_id
-        cluster_size = cluster_mask.sum()
-        cluster_percentage = (cluster_size / len(labels)) * 100
-        
-        cluster_stats.append({
-            'Cluster': cluster_id,
-            'Estudiantes': cluster_size,
-            'Porcentaje': f"{cluster_percentage:.1f}%"
-        })
-    
-    df_stats = pd.DataFrame(cluster_stats)
-    st.dataframe(df_stats, use_container_width=True, hide_index=True)
\ No newline at end of file
+    # Asignar cluster a todos los estudiantes y perfilar en una sola pasada
+    labels_full = kmeans.predict(scaler.transform(df_data[score_cols]))
+    df_stats = ClusteringEngine().profile_clusters(
+        df_data, labels_full, score_cols, n_clusters=kmeans.n_clusters
+    )
+    
+    st.caption(f"Perfil calculado sobre {len(labels_full)} estudiantes (unidades originales)")
+    st.dataframe(df_stats, use_container_width=True, hide_index=True)
+    
+    # ==================== ESTABILIDAD DE K ====================
+    
+    st.markdown("#### Estabilidad de k")
+    st.caption(
+        "Ajusta KMeans sobre submuestras en paralelo y compara con la referencia: "
+        "ARI medio y Jaccard por cluster (estable > 0.75)"
+    )
+    
+    if st.button("Analizar Estabilidad", use_container_width=True):
+        with st.spinner("Ejecutando submuestras de KMeans en paralelo..."):
+            df_stability = ClusteringEngine().stability_analysis(
+                X=X_scaled,
+                k_range=range(CLUSTERING['k_min'], CLUSTERING['k_max'] + 1),
+                n_runs=CLUSTERING['stability_runs'],
+                sample_frac=CLUSTERING['stability_sample_frac'],
+                n_jobs=CLUSTERING['stability_jobs'],
+                random_state=CLUSTERING['random_state']
+            )
+        st.dataframe(df_stability, use_container_width=True, hide_index=True)
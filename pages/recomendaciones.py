@@ -262,33 +262,57 @@ def show_recomendaciones():
         st.markdown("### Estudiantes Guardados")
         st.markdown("Lista de todos los estudiantes en la API")
         
-        if st.button("Refrescar Lista", use_container_width=True):
+        col_tam, col_orden = st.columns(2)
+        with col_tam:
+            page_size = st.selectbox("Estudiantes por página", [50, 100, 500, 1000], index=1)
+        with col_orden:
+            recientes = st.checkbox("Más recientes primero", value=True)
+        
+        # Cursor de la página siguiente (paginación por llave)
+        if "students_cursor" not in st.session_state:
+            st.session_state.students_cursor = None
+            st.session_state.students_pages = []
+        
+        col_refrescar, col_mas = st.columns(2)
+        with col_refrescar:
+            refrescar = st.button("Refrescar Lista", use_container_width=True)
+        with col_mas:
+            cargar_mas = st.button(
+                "Cargar más", use_container_width=True,
+                disabled=st.session_state.students_cursor is None
+            )
+        
+        if refrescar or cargar_mas:
+            params = {
+                "limit": page_size,
+                "descendente": recientes,
+                "incluir_puntuaciones": True
+            }
+            if cargar_mas:
+                params["cursor"] = st.session_state.students_cursor
+            else:
+                st.session_state.students_pages = []
+            
             try:
                 response = requests.get(
                     f"{API_BASE_URL}/students",
-                    timeout=5
+                    params=params,
+                    timeout=10
                 )
                 
                 if response.status_code == 200:
                     data = response.json()
-                    total = data['total_estudiantes']
-                    
-                    st.success(f"Total de estudiantes: {total}")
-                    
-                    if total > 0:
-                        # Mostrar tabla
-                        estudiantes_list = []
-                        for est in data['estudiantes']:
-                            estudiantes_list.append({
-                                'ID': est['id'],
-                                'Timestamp Guardado': est['timestamp_guardado']
-                            })
-                        
-                        df = pd.DataFrame(estudiantes_list)
-                        st.dataframe(df, use_container_width=True, hide_index=True)
-                    
-                    else:
-                        st.info("No hay estudiantes guardados aun")
+                    st.session_state.students_total = data['total_estudiantes']
+                    st.session_state.students_cursor = data['siguiente_cursor']
+                    st.session_state.students_pages.extend(
+                        {
+                            'ID': est['id'],
+                            'Timestamp Guardado': est['timestamp_guardado'],
+                            **{area.replace('PUNT_', ''): valor for area, valor in est['puntuaciones'].items()}
+                        }
+                        for est in data['estudiantes']
+                    )
+                    st.rerun()
                 
                 else:
                     st.error(f"Error: {response.json()}")
@@ -297,6 +321,18 @@ def show_recomendaciones():
                 st.error("No se puede conectar con la API")
             except Exception as e:
                 st.error(f"Error: {str(e)}")
+        
+        if "students_total" in st.session_state:
+            total = st.session_state.students_total
+            st.success(f"Total de estudiantes: {total}")
+            
+            if st.session_state.students_pages:
+                # Mostrar tabla
+                df = pd.DataFrame(st.session_state.students_pages)
+                st.dataframe(df, use_container_width=True, hide_index=True)
+                st.caption(f"Mostrando {len(df)} de {total}")
+            else:
+                st.info("No hay estudiantes guardados aun")
     
     # ==================== TAB 4: GESTION (GET DETAIL + DELETE) ====================
     
@@ -0,0 +1,35 @@
+# test_recommendation.py
+"""
+Equivalencia entre la recomendación individual y la vectorizada
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'modulos'))
+
+from recommendation import RecommendationEngine
+
+
+def test_frame_matches_scalar_with_decimal_scores():
+    engine = RecommendationEngine()
+    rng = np.random.default_rng(0)
+    # Puntajes con un decimal: muchos casos .xx5 al calcular la relevancia
+    X = np.round(rng.uniform(0, 100, (20000, len(engine.areas_list))), 1)
+    X[0] = [40.0, 88.5, 10.0, 20.0, 30.0]
+    frame = engine.get_recommendations_frame(X)
+
+    for i, row in enumerate(X):
+        rec = engine.get_recommendations(dict(zip(engine.areas_list, row.tolist())))
+        expected = {r['posicion']: r for r in rec['recomendaciones']}
+        for k in (1, 2):
+            carrera = frame[f'carrera_{k}'].iat[i]
+            if k not in expected:
+                assert carrera is None
+                continue
+            assert carrera == expected[k]['carrera']
+            assert frame[f'relevancia_{k}'].iat[i] == expected[k]['relevancia']
+            assert frame[f'razon_{k}'].iat[i] == expected[k]['razon']
@@ -0,0 +1,95 @@
+# test_storage.py
+"""
+Ida y vuelta por todos los backends de almacenamiento
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'modulos'))
+
+from storage import StudentStore, create_store, AREAS
+
+
+BACKEND_CONFIGS = {
+    'memoria': {'backend': 'memoria'},
+    'columnar': {'backend': 'columnar', 'initial_capacity': 4},
+    'particionado': {'backend': 'particionado', 'shards': 4, 'initial_capacity': 4},
+    'particionado-memoria': {'backend': 'particionado', 'shards': 4, 'shard_backend': 'memoria'},
+    'sqlite': {'backend': 'sqlite', 'pool_size': 2}
+}
+
+
+@pytest.fixture(params=list(BACKEND_CONFIGS))
+def store(request, tmp_path):
+    config = dict(BACKEND_CONFIGS[request.param], path=str(tmp_path / 'estudiantes.sqlite'))
+    store = create_store(config)
+    yield store
+    store.close()
+
+
+def _pages(store, limit, **kwargs):
+    """Recorrer todas las páginas siguiendo el cursor del último elemento"""
+    items, after = [], None
+    while True:
+        page = list(store.iter_page(after=after, limit=limit, **kwargs))
+        items.extend(page)
+        if len(page) < limit:
+            return items
+        after = (page[-1][1], page[-1][0])
+
+
+def test_interface_is_abstract():
+    with pytest.raises(TypeError):
+        StudentStore()
+
+
+def test_round_trip(store):
+    base = datetime(2024, 3, 1, 8, 0, 0)
+    rng = np.random.default_rng(0)
+    scores = np.round(rng.uniform(0, 100, (25, len(AREAS))), 1)
+    ids = [f"EST{i:03d}" for i in range(25)]
+    store.upsert_many(ids[:20], scores[:20], base.isoformat())
+    for i in range(20, 25):
+        store.upsert(ids[i], scores[i].tolist(), (base + timedelta(minutes=i)).isoformat())
+    # Reemplazo: el último valor gana
+    store.upsert(ids[0], [10.0] * len(AREAS), (base + timedelta(hours=1)).isoformat())
+    scores[0] = 10.0
+
+    assert len(store) == 25
+    record = store.get(ids[3])
+    assert [record[area] for area in AREAS] == pytest.approx(scores[3].tolist(), abs=1e-4)
+    assert record['timestamp_guardado'] == base.isoformat()
+    assert store.get('NOEXISTE') is None
+    assert ids[3] in store and 'NOEXISTE' not in store
+
+    found, rows = store.get_scores([ids[5], 'NOEXISTE', ids[0]])
+    assert found.tolist() == [True, False, True]
+    np.testing.assert_allclose(rows, scores[[5, 0]], atol=1e-4)
+
+    # Paginación con cursor en ambos órdenes
+    by_time = _pages(store, 7)
+    assert [item[0] for item in by_time] == ids[1:20] + ids[20:25] + [ids[0]]
+    by_id = _pages(store, 6, order_by='id', include_scores=True)
+    assert [item[0] for item in by_id] == sorted(ids)
+    np.testing.assert_allclose([item[2] for item in by_id], scores, atol=1e-4)
+    newest = list(store.iter_page(limit=2, descending=True))
+    assert [item[0] for item in newest] == [ids[0], ids[24]]
+
+    assert store.delete(ids[7])
+    assert not store.delete(ids[7])
+    assert store.get(ids[7]) is None
+    assert len(store) == 24
+
+    remaining = np.delete(scores, 7, axis=0)
+    stats = store.stats()
+    assert stats['total'] == 24
+    for j, area in enumerate(AREAS):
+        assert stats['areas'][area.replace('PUNT_', '')]['media'] == pytest.approx(
+            remaining[:, j].mean(), abs=1e-3
+        )
@@ -129,8 +129,8 @@ def plot_timeseries(ts_data, area_name):
     )
     return fig
 
-def plot_arima_prediction(train, test, predictions):
-    """Gráfico de predicción ARIMA"""
+def plot_arima_prediction(train, test, predictions, lower=None, upper=None):
+    """Gráfico de predicción ARIMA (con banda de intervalo opcional)"""
     fig = go.Figure()
     
     x_train = list(range(len(train)))
@@ -144,6 +144,14 @@ def plot_arima_prediction(train, test, predictions):
         x=x_test, y=test.values, mode='lines+markers',
         name='Real', line=dict(color='orange'), marker=dict(size=6)
     ))
+    if lower is not None and upper is not None:
+        fig.add_trace(go.Scatter(
+            x=x_test + x_test[::-1],
+            y=list(upper) + list(lower)[::-1],
+            fill='toself', fillcolor='rgba(46, 204, 113, 0.2)',
+            line=dict(color='rgba(0, 0, 0, 0)'), hoverinfo='skip',
+            name='Intervalo de prediccion'
+        ))
     fig.add_trace(go.Scatter(
         x=x_test, y=predictions.values, mode='lines+markers',
         name='Predicción ARIMA', line=dict(color='green', dash='dash'), marker=dict(size=6)